@@ -18,21 +18,81 @@
 
 import time
 import json
-from ngenic_http11 import get_json
+from ngenic_http11 import Session
 
 HOST = "app.ngenic.se"
 BASE = "/api/v3"
 
 
+def _field(body, key):
+    """Start index of the value after b'"key":' in body (spaces skipped), or -1."""
+    i = body.find(key)
+    if i < 0:
+        return -1
+    i += len(key)
+    while i < len(body) and body[i] == 32:
+        i += 1
+    return i
+
+
+def _parse_latest(body):
+    """
+    (has_value, time_str, value) from a "latest" body:
+    {"hasValue": true, "time": "...", "value": 1.23}
+    Scans for the three known fields instead of building a dict; anything
+    unexpected falls back to json.loads. None if the body isn't JSON at all.
+    """
+    try:
+        i = _field(body, b'"hasValue":')
+        if i < 0:
+            raise ValueError
+        has_value = body[i:i + 4] == b"true"
+
+        time_str = None
+        i = _field(body, b'"time":')
+        if i >= 0 and body[i:i + 1] == b'"':
+            j = body.find(b'"', i + 1)
+            time_str = body[i + 1:j].decode()
+
+        value = None
+        i = _field(body, b'"value":')
+        if i >= 0:
+            j = i
+            while j < len(body) and body[j] != 44 and body[j] != 125:  # "," "}"
+                j += 1
+            raw = body[i:j].strip()
+            if raw != b"null":
+                value = float(raw.decode())
+        return has_value, time_str, value
+    except Exception:
+        pass
+    try:
+        d = json.loads(body)
+        return bool(d.get("hasValue", False)), d.get("time"), d.get("value")
+    except Exception:
+        return None
+
+
 class NgenicClient:
-    def __init__(self, secrets_path="/secrets.json"):
-        with open(secrets_path, "r") as f:
-            sec = json.load(f)
+    def __init__(self, secrets_path="/secrets.json", secrets=None):
+        # Pass an already parsed secrets dict to skip re-reading the file.
+        sec = secrets
+        if sec is None:
+            with open(secrets_path, "r") as f:
+                sec = json.load(f)
 
         self.token = sec["ngenic_token"]
         self.tune_uuid = sec["ngenic_tune_uuid"]
         self.node_uuid = sec["ngenic_grid_node_uuid"]
 
+        # Both "latest" reads go out pipelined on one keep-alive connection.
+        self._session = Session(HOST, timeout_s=20)
+        self._latest_paths = (
+            self._latest_path("power_kW").encode(),
+            self._latest_path("produced_power_kW").encode(),
+        )
+        self._req_headers = self._headers()
+
         self._cache = {
             "import_kW": None,
             "export_kW": None,
@@ -48,16 +108,24 @@ class NgenicClient:
             "learned_interval_s": None,
         }
 
-        # Backoff control (errors / 429)
-        self._next_allowed_ms = time.ticks_ms()
+        # Bumped whenever _cache changes (every poll, success or failure).
+        self.version = 0
+
+        # Backoff control (errors / 429), device epoch seconds
+        self._backoff_until_epoch = 0
         self._fail_count = 0
 
+        # Adaptive schedule: the next poll moment, recomputed once per poll so
+        # the per-second check is a single compare. 0 => poll now.
+        self._next_poll_epoch = 0
+
         # Learning / cadence tracking (based on changes in Ngenic's "time" string)
         self._last_time_str = None
         self._last_change_epoch = None  # device epoch when time_str last changed
 
-        # Rolling interval estimate (seconds). Start with what your logs show most often.
-        self._interval_est_s = 60.0
+        # Rolling interval estimate in 1/16 s (fixed point keeps the EWMA off
+        # the float path). Start with what your logs show most often.
+        self._interval_est_x16 = 60 * 16
 
         # Polling knobs (defaults)
         self._fast_boot_polls = 6           # first few polls: more eager to get initial values
@@ -80,6 +148,7 @@ class NgenicClient:
         self._lead_s = 0
         self._chase_poll_s = poll_s
         self._chase_window_s = 300
+        self._schedule_next_poll()
 
     def set_polling_mode_default(self):
         """Return to conservative adaptive defaults."""
@@ -89,12 +158,13 @@ class NgenicClient:
         self._lead_s = 8
         self._chase_poll_s = 5
         self._chase_window_s = 40
+        self._schedule_next_poll()
 
     # --- Public API ---
     def get_cached(self):
-        d = dict(self._cache)
-        d["age_s"] = self._compute_age_s()
-        return d
+        """The live cache dict with age_s refreshed (no copy); treat as read-only."""
+        self._cache["age_s"] = self._compute_age_s()
+        return self._cache
 
     def refresh_if_due(self, force=False):
         """
@@ -110,13 +180,16 @@ class NgenicClient:
 
         now_epoch = time.time()
 
-        if not force:
-            if not self._should_poll_now(now_epoch):
-                return self.get_cached()
+        if not force and now_epoch < self._next_poll_epoch:
+            return self.get_cached()
 
+        self.version += 1
         try:
-            imp_val, imp_time = self._fetch_value_and_time("power_kW")
-            exp_val, exp_time = self._fetch_value_and_time("produced_power_kW")
+            imp_resp, exp_resp = self._session.get_json_pipeline(
+                self._latest_paths, self._req_headers, parser=_parse_latest
+            )
+            imp_val, imp_time = self._value_and_time("power_kW", imp_resp)
+            exp_val, exp_time = self._value_and_time("produced_power_kW", exp_resp)
 
             net = None
             if (imp_val is not None) or (exp_val is not None):
@@ -136,10 +209,11 @@ class NgenicClient:
                 "ok": True,
                 "last_error": None,
                 "ngenic_time_changed_epoch": self._last_change_epoch,
-                "learned_interval_s": round(self._interval_est_s, 1),
+                "learned_interval_s": round(self._interval_est_x16 / 16, 1),
             })
 
             self._fail_count = 0
+            self._schedule_next_poll()
             return self.get_cached()
 
         except Exception as e:
@@ -150,6 +224,7 @@ class NgenicClient:
             # Exponential-ish backoff on errors (capped)
             backoff_s = min(120, 5 * (2 ** min(self._fail_count - 1, 4)))
             self._set_backoff(backoff_s)
+            self._schedule_next_poll()
 
             return self.get_cached()
 
@@ -173,38 +248,41 @@ class NgenicClient:
         }
 
     def _set_backoff(self, seconds):
-        self._next_allowed_ms = time.ticks_add(time.ticks_ms(), int(seconds * 1000))
+        self._backoff_until_epoch = time.time() + int(seconds)
 
     def _in_backoff(self):
-        return time.ticks_diff(time.ticks_ms(), self._next_allowed_ms) < 0
+        return time.time() < self._backoff_until_epoch
 
-    def _should_poll_now(self, now_epoch):
-        # If we've never successfully updated, be eager.
-        if self._cache["updated_epoch"] is None:
-            return True
+    def _schedule_next_poll(self):
+        """Sets _next_poll_epoch from the current phase (boot / idle / chase)."""
+        updated = self._cache["updated_epoch"]
+
+        # Never successfully updated: be eager (backoff still applies).
+        if updated is None:
+            self._next_poll_epoch = 0
+            return
 
         # Initial eager polling for a few cycles
         if self._fast_boot_polls > 0:
-            return (now_epoch - self._cache["updated_epoch"]) >= self._boot_poll_s
-
-        # If we don't yet have a change reference, just idle poll.
-        if self._last_change_epoch is None:
-            return (now_epoch - self._cache["updated_epoch"]) >= self._idle_poll_s
-
-        # Predict next update based on last observed change and interval estimate
-        expected = self._last_change_epoch + self._interval_est_s
-        dt = now_epoch - expected  # negative => before expected; positive => after expected
+            self._next_poll_epoch = updated + self._boot_poll_s
+            return
 
-        # If we're far from the boundary, idle poll occasionally
-        if dt < -self._lead_s:
-            return (now_epoch - self._cache["updated_epoch"]) >= self._idle_poll_s
+        idle_at = updated + self._idle_poll_s
 
-        # Near/after boundary: chase until we see the time string change
-        if dt <= self._chase_window_s:
-            return (now_epoch - self._cache["updated_epoch"]) >= self._chase_poll_s
+        # No change reference yet: just idle poll.
+        if self._last_change_epoch is None:
+            self._next_poll_epoch = idle_at
+            return
 
-        # Way past expected and still no update: revert to idle polling
-        return (now_epoch - self._cache["updated_epoch"]) >= self._idle_poll_s
+        # Predict the next upstream update and chase around it: poll every
+        # _chase_poll_s from _lead_s before it until _chase_window_s after.
+        # Outside that window (or once it has passed) fall back to idle polling.
+        expected = self._last_change_epoch + (self._interval_est_x16 >> 4)
+        chase_at = max(expected - self._lead_s, updated + self._chase_poll_s)
+        if chase_at <= expected + self._chase_window_s:
+            self._next_poll_epoch = min(idle_at, chase_at)
+        else:
+            self._next_poll_epoch = idle_at
 
     def _observe_time_string_change(self, time_str, now_epoch):
         if not time_str:
@@ -223,9 +301,8 @@ class NgenicClient:
                 observed = now_epoch - self._last_change_epoch
                 # Ignore nonsense deltas
                 if 10 <= observed <= 300:
-                    # Update estimate gently (EWMA) so it can adapt but not bounce
-                    alpha = 0.25
-                    self._interval_est_s = (1 - alpha) * self._interval_est_s + alpha * observed
+                    # Update estimate gently (EWMA, alpha = 1/4) so it can adapt but not bounce
+                    self._interval_est_x16 += (int(observed * 16) - self._interval_est_x16) >> 2
 
             self._last_time_str = time_str
             self._last_change_epoch = now_epoch
@@ -239,17 +316,13 @@ class NgenicClient:
             if self._fast_boot_polls > 0:
                 self._fast_boot_polls -= 1
 
-    def _latest(self, typ, timeout_s=20):
-        path = "{}/tunes/{}/measurements/{}/latest?type={}".format(
+    def _latest_path(self, typ):
+        return "{}/tunes/{}/measurements/{}/latest?type={}".format(
             BASE, self.tune_uuid, self.node_uuid, typ
         )
-        status, hdrs, parsed, body = get_json(
-            HOST, path, headers=self._headers(), timeout_s=timeout_s, server_hostname=HOST
-        )
-        return status, hdrs, parsed, body
 
-    def _fetch_value_and_time(self, typ):
-        status, hdrs, parsed, body = self._latest(typ)
+    def _value_and_time(self, typ, resp):
+        status, hdrs, parsed, body = resp
 
         if status == 204:
             return None, None
@@ -263,12 +336,13 @@ class NgenicClient:
             self._set_backoff(wait_s)
             raise RuntimeError("Rate limited (429), retry-after={}".format(ra))
 
-        if status != 200 or not isinstance(parsed, dict):
+        if status != 200 or parsed is None:
             snip = body[:120]
             raise RuntimeError("HTTP {} for {} body={}".format(status, typ, snip))
 
-        # parsed: {'hasValue': True/False, 'time': '...', 'value': ...}
-        if not parsed.get("hasValue", False):
-            return None, parsed.get("time")
+        # parsed: (hasValue, time, value) from _parse_latest
+        has_value, time_str, value = parsed
+        if not has_value:
+            return None, time_str
 
-        return parsed.get("value"), parsed.get("time")
\ No newline at end of file
+        return value, time_str
\ No newline at end of file
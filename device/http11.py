@@ -0,0 +1,239 @@
+# http11.py — minimal streaming HTTP/1.1 over TLS client for the launcher
+#
+# urequests speaks HTTP/1.0, which some servers reject (426) and which cannot
+# do ranged requests. This client sends HTTP/1.1, parses the status line and
+# headers, then leaves the body on the socket so callers can stream it with
+# readinto() (Content-Length, chunked, or read-until-close).
+#
+# AsyncSession keeps one TLS stream alive across requests to the same host, so
+# an OTA run pays for a single handshake instead of one per file; the updater
+# runs a few sessions side by side to download concurrently.
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+USER_AGENT = "ESP32C6-MicroPython/1.27 laundry-assistant"
+MAX_REDIRECTS = 3
+
+
+def split_url(url):
+    """Returns (scheme, host, port, path) for an http(s) URL."""
+    scheme, rest = url.split("://", 1)
+    if "/" in rest:
+        hostport, path = rest.split("/", 1)
+        path = "/" + path
+    else:
+        hostport, path = rest, "/"
+
+    if ":" in hostport:
+        host, port = hostport.split(":", 1)
+        port = int(port)
+    else:
+        host = hostport
+        port = 443 if scheme == "https" else 80
+    return scheme, host, port, path
+
+
+class _Body:
+    """Body framing state (Content-Length, chunked or until close)."""
+
+    def _init_body(self, headers, session):
+        self._session = session
+        self._chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+        clen = headers.get("content-length")
+        self._remaining = int(clen) if clen is not None else -1  # -1 => until close
+        if self._chunked:
+            self._remaining = 0
+        self._done = self._remaining == 0 and not self._chunked
+
+        # The connection can only be reused if the body has a known end.
+        self._reusable = (
+            session is not None
+            and (self._chunked or clen is not None)
+            and headers.get("connection", "").lower() != "close"
+        )
+
+    def _need_chunk_header(self):
+        return self._chunked and self._remaining == 0
+
+    def _chunk_header(self, line):
+        """Parses a chunk-size line. Returns True for the final (empty) chunk."""
+        self._remaining = int(line.split(b";", 1)[0].strip() or b"0", 16)
+        return self._remaining == 0
+
+    def _target(self, buf):
+        want = len(buf)
+        if 0 <= self._remaining < want:
+            return memoryview(buf)[:self._remaining]
+        return buf
+
+    def _consumed(self, n):
+        """Books n body bytes. Returns True if a chunk's trailing CRLF follows."""
+        if not n:
+            self._done = True
+            self._reusable = False
+            return False
+        if self._remaining >= 0:
+            self._remaining -= n
+            if self._remaining == 0:
+                if self._chunked:
+                    return True
+                self._done = True
+        return False
+
+
+class AsyncResponse(_Body):
+    """Response on an asyncio stream; every read is bounded by timeout_s."""
+
+    def __init__(self, stream, status_code, headers, session, timeout_s):
+        self._s = stream
+        self._timeout_s = timeout_s
+        self.status_code = status_code
+        self.headers = headers  # lower-cased keys
+        self._init_body(headers, session)
+
+    async def _readline(self):
+        return await asyncio.wait_for(self._s.readline(), self._timeout_s)
+
+    async def readinto(self, buf):
+        if self._done:
+            return 0
+
+        if self._need_chunk_header():
+            if self._chunk_header(await self._readline()):
+                while True:
+                    ln = await self._readline()
+                    if not ln or ln == b"\r\n":
+                        break
+                self._done = True
+                return 0
+
+        n = await asyncio.wait_for(self._s.readinto(self._target(buf)), self._timeout_s)
+        if self._consumed(n):
+            await self._readline()
+        return n or 0
+
+    async def close(self):
+        if self._reusable and self._done:
+            self._session._release(self._s)
+            return
+        await self._session._discard(self._s)
+
+
+def _request_bytes(host, path, headers, keep_alive):
+    req = "GET %s HTTP/1.1\r\nHost: %s\r\nUser-Agent: %s\r\nConnection: %s\r\n" % (
+        path, host, USER_AGENT, "keep-alive" if keep_alive else "close"
+    )
+    if headers:
+        for k, v in headers.items():
+            req += "%s: %s\r\n" % (k, v)
+    req += "\r\n"
+    return req.encode("utf-8")
+
+
+def _status_code(line):
+    parts = line.decode("utf-8", "ignore").split(" ", 2)
+    return int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+
+
+def _add_header(hdrs, ln):
+    if b":" in ln:
+        k, v = ln.split(b":", 1)
+        hdrs[k.strip().decode().lower()] = v.strip().decode()
+
+
+def _redirect_target(scheme, host, status, hdrs):
+    if status in (301, 302, 303, 307, 308) and hdrs.get("location"):
+        loc = hdrs["location"]
+        if loc.startswith("/"):
+            loc = "%s://%s%s" % (scheme, host, loc)
+        return loc
+    return None
+
+
+class AsyncSession:
+    """
+    One keep-alive stream per session. A new host, a server that closes, or a
+    body read only partially drops the stream and the next request reconnects.
+    Run one session per concurrent worker; a session serves one request at a
+    time.
+    """
+
+    def __init__(self, timeout_s=20):
+        self._timeout_s = timeout_s
+        self._s = None
+        self._key = None
+
+    def _release(self, s):
+        self._s = s
+
+    async def _discard(self, s):
+        try:
+            s.close()
+            await s.wait_closed()
+        except Exception:
+            pass
+        if self._s is s:
+            self._s = None
+
+    async def close(self):
+        if self._s is not None:
+            await self._discard(self._s)
+
+    async def _open(self, key):
+        if self._s is not None and self._key == key:
+            s, self._s = self._s, None
+            return s, True
+        await self.close()
+        self._key = key
+        scheme, host, port = key
+        s, _w = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=(scheme == "https")), self._timeout_s
+        )
+        return s, False
+
+    async def _exchange(self, s, host, path, headers):
+        s.write(_request_bytes(host, path, headers, True))
+        await s.drain()
+        status = _status_code(await asyncio.wait_for(s.readline(), self._timeout_s))
+        hdrs = {}
+        while True:
+            ln = await asyncio.wait_for(s.readline(), self._timeout_s)
+            if not ln or ln == b"\r\n":
+                break
+            _add_header(hdrs, ln)
+        return status, hdrs
+
+    async def get(self, url, headers=None):
+        for _ in range(MAX_REDIRECTS + 1):
+            scheme, host, port, path = split_url(url)
+            key = (scheme, host, port)
+
+            s, reused = await self._open(key)
+            try:
+                status, hdrs = await self._exchange(s, host, path, headers)
+                if status == 0 and reused:
+                    raise OSError("stale keep-alive connection")
+            except Exception:
+                self._key = None
+                await self._discard(s)
+                if not reused:
+                    raise
+                s, _ = await self._open(key)
+                status, hdrs = await self._exchange(s, host, path, headers)
+
+            resp = AsyncResponse(s, status, hdrs, self, self._timeout_s)
+
+            target = _redirect_target(scheme, host, status, hdrs)
+            if target:
+                buf = bytearray(256)
+                while await resp.readinto(buf):
+                    pass
+                await resp.close()
+                url = target
+                continue
+            return resp
+
+        raise RuntimeError("Too many redirects for %s" % url)
@@ -0,0 +1,19 @@
+# secrets.py — single parsed copy of /secrets.json shared by every boot stage
+#
+# main.py, the app and the ngenic tools all need the same few keys. Parsing the
+# file once and handing out the same dict avoids repeated flash reads and
+# json.load() calls (slow on MicroPython).
+
+import json
+
+SECRETS_PATH = "/secrets.json"
+
+_secrets = None
+
+
+def get_secrets():
+    global _secrets
+    if _secrets is None:
+        with open(SECRETS_PATH, "r") as f:
+            _secrets = json.load(f)
+    return _secrets
@@ -5,6 +5,8 @@ import time
 import machine
 import neopixel
 
+_OFF = (0, 0, 0)  # identical in RGB and GRB order
+
 
 class StatusLED:
     def __init__(self, pin=8, n=1, order="GRB"):
@@ -13,11 +15,13 @@ class StatusLED:
 
         self._mode = "off"          # off | solid | blink
         self._solid = (0, 0, 0)
-        self._blink = (0, 0, 0)
+        self._blink_mapped = _OFF
         self._interval_ms = 250
         self._last_ms = time.ticks_ms()
         self._is_on = False
-        self.off()
+        # Unknown: the LED keeps its last colour across a soft reset, so the
+        # first write (even off()) must always go out.
+        self._last_written = None
 
     def _map(self, rgb):
         r, g, b = rgb
@@ -25,29 +29,33 @@ class StatusLED:
             return (g, r, b)
         return (r, g, b)
 
-    def _write(self, rgb):
-        self._np[0] = self._map(rgb)
+    def _write(self, mapped):
+        # Takes an already mapped tuple; skips the transmit if nothing changes.
+        if mapped == self._last_written:
+            return
+        self._np[0] = mapped
         self._np.write()
+        self._last_written = mapped
 
     def off(self):
         self._mode = "off"
-        self._solid = (0, 0, 0)
+        self._solid = _OFF
         self._is_on = False
-        self._write((0, 0, 0))
+        self._write(_OFF)
 
     def solid(self, rgb):
         self._mode = "solid"
         self._solid = rgb
         self._is_on = True
-        self._write(rgb)
+        self._write(self._map(rgb))
 
     def blink(self, rgb, interval_ms=250):
         self._mode = "blink"
-        self._blink = rgb
+        self._blink_mapped = self._map(rgb)  # mapped once, reused every toggle
         self._interval_ms = int(interval_ms)
         self._last_ms = time.ticks_ms()
         self._is_on = True
-        self._write(rgb)
+        self._write(self._blink_mapped)
 
     def tick(self):
         # Call frequently from long loops (Wi‑Fi connect, file download, etc.)
@@ -60,4 +68,4 @@ class StatusLED:
 
         self._last_ms = now
         self._is_on = not self._is_on
-        self._write(self._blink if self._is_on else (0, 0, 0))
\ No newline at end of file
+        self._write(self._blink_mapped if self._is_on else _OFF)
\ No newline at end of file
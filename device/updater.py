@@ -1,27 +1,92 @@
 # updater.py — ESP32_GENERIC_C6 / MicroPython v1.27.0
 #
 # OTA updater with:
-# - Manifest-driven file list
+# - Manifest-driven file list; optional root_sha256 over the (path, sha256)
+#   list, checked before staging
+# - HTTP/1.1 client (http11.py) instead of urequests' HTTP/1.0; gzip transfer
+#   encoding when the firmware has the deflate module
 # - Optional SHA-256 integrity checks (can be disabled via secrets ota_verify_sha=false)
 # - Staging directory (/next) then swap to (/app); keep (/app_prev)
-# - Rollback after repeated boot failures
+# - Resumable downloads (HTTP/1.1 Range + If-Range) so retries and reboots
+#   continue partially staged files instead of starting over; only files with a
+#   manifest sha256 are resumed; single-pass downloads are hashed while
+#   written, resumed ones in a separate pass over the landed file
+# - Concurrent downloads (asyncio, OTA_PARALLEL keep-alive connections); the
+#   manifest's connection is handed on to the first download worker
+# - Delta updates: files whose installed copy already matches the manifest
+#   sha256 are copied from /app instead of downloaded; /app/_manifest.json
+#   records the installed hashes so unchanged files skip the source hash pass
+# - Rollback after repeated boot failures (counter kept in RTC memory across
+#   warm resets; /state.json is only rewritten on real transitions)
 # - Optional status LED tick hooks
+# - Wi-Fi power save off once associated: more idle current, much lower
+#   per-request latency for the app that runs on the same link
 
+import gc
+import io
 import os
+import errno
 import json
 import time
 import machine
 import network
+import random
 import ubinascii
-import urequests as requests
+import micropython
+from micropython import const
+
+import http11
+
+try:
+    import deflate  # MicroPython 1.23+
+except ImportError:
+    deflate = None  # no gzip support: plain transfers only
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
 
 try:
     import uhashlib as hashlib  # MicroPython
 except ImportError:
     import hashlib  # fallback (unlikely on ESP32)
 
+# SHA-256 backend. The ESP32 port's hashlib runs on mbedtls, which uses the
+# C6's SHA engine when the IDF build has CONFIG_MBEDTLS_HARDWARE_SHA (default).
+# A firmware with a native usha_hw module can route it there explicitly.
+# The engine holds one context at a time; mbedtls falls back to software for
+# a second concurrent context, so overlapping workers stay correct.
+try:
+    from usha_hw import sha256 as _sha256
+except ImportError:
+    _sha256 = hashlib.sha256
+
+# Prime the json module: MicroPython's first json.loads() is several times
+# slower unless json.dumps() has run once (CircuitPython json issue).
+json.dumps(None)
+
+# Collect once a quarter of the free heap has been allocated instead of when
+# it runs out: OTA churns through TLS records and file buffers, and an early
+# GC keeps the heap from fragmenting before the next large allocation.
+gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
+
 STATE_PATH = "/state.json"
-CHUNK_SIZE = 1024
+INSTALLED_MANIFEST = "_manifest.json"  # per-file hashes of the installed app, kept inside /app
+CHUNK_SIZE = 8192  # stream/hash block; fewer, larger calls into C per MB
+MIN_CHUNK_SIZE = 2048  # fallback when the heap is too fragmented for CHUNK_SIZE
+MAX_BOOT_FAILURES = 3
+OTA_PARALLEL = 2  # concurrent download connections (each TLS session costs heap)
+RETRY_SLEEP_MIN_S = 0.5
+RETRY_SLEEP_MAX_S = 30  # cap for both jittered backoff and Retry-After
+LED_TICK_MS = 50
+WIFI_POLL_MS = 200
+
+_S_IFDIR = const(0x4000)  # ilistdir type field for a directory
+
+# RTC memory survives machine.reset()/soft resets but not power loss.
+# Layout: magic (2 bytes) + boot failure counter (1 byte).
+_RTC_MAGIC = b"LA"
 
 _status_led = None
 _verify_sha = True  # default
@@ -58,167 +123,663 @@ def _save_json(path, obj):
         json.dump(obj, f)
 
 
+@micropython.native
 def _parse_ver(v):
-    try:
-        return tuple(int(x) for x in v.strip().split("."))
-    except Exception:
+    # "1.2.3" -> (1, 2, 3); anything malformed -> (0,). Digits are folded by
+    # hand: no split() list or per-part int() strings.
+    if not isinstance(v, str):
+        return (0,)
+    out = []
+    n = 0
+    digits = False
+    for c in v.strip():
+        if c == ".":
+            if not digits:
+                return (0,)
+            out.append(n)
+            n = 0
+            digits = False
+        elif "0" <= c <= "9":
+            n = n * 10 + ord(c) - 48
+            digits = True
+        else:
+            return (0,)
+    if not digits:
         return (0,)
+    out.append(n)
+    return tuple(out)
 
 
-def _mkdirs(path):
-    parts = [p for p in path.split("/") if p]
-    cur = ""
-    for p in parts:
-        cur += "/" + p
+def _make_staging_dirs(files):
+    """
+    Creates /next and every directory the manifest needs, once each. Sorted,
+    parents come before children, so each is a single mkdir.
+    """
+    dirs = set()
+    for f in files:
+        rel = f["path"].lstrip("/")
+        i = rel.rfind("/")
+        while i > 0:
+            rel = rel[:i]
+            dirs.add(rel)
+            i = rel.rfind("/")
+    for d in ["/next"] + ["/next/" + d for d in sorted(dirs)]:
         try:
-            os.mkdir(cur)
+            os.mkdir(d)
         except OSError:
-            pass
+            pass  # already there (resumed staging)
 
 
 def _rmtree(path):
-    try:
-        os.stat(path)
-    except OSError:
-        return
-
-    try:
-        for name, typ, *_ in os.ilistdir(path):
-            p = path.rstrip("/") + "/" + name
-            if typ == 0x4000:
-                _rmtree(p)
+    # Iterative walk (no recursion on MicroPython's small stack). ilistdir's
+    # type field tells files from dirs, so nothing is stat'ed; directories are
+    # removed deepest-first once their contents are gone.
+    stack = [path]
+    dirs = []
+    while stack:
+        p = stack.pop()
+        try:
+            # Materialised first: deleting while iterating can skip entries.
+            entries = list(os.ilistdir(p))
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                continue  # nothing there: no point trying to remove it
+            # ENOTDIR (or anything else): remove it as a file.
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+            continue
+
+        dirs.append(p)
+        base = p.rstrip("/") + "/"
+        for name, typ, *_ in entries:
+            sub = base + name
+            if typ == _S_IFDIR:
+                stack.append(sub)
             else:
                 try:
-                    os.remove(p)
+                    os.remove(sub)
                 except OSError:
                     pass
-        os.rmdir(path)
-    except OSError:
+
+    for p in reversed(dirs):
         try:
-            os.remove(path)
+            os.rmdir(p)
         except OSError:
             pass
 
 
-def connect_wifi(ssid, password, timeout_s=20):
+async def led_sleep_ms(ms):
+    """Sleeps ms while keeping the status LED animation ticking."""
+    t0 = time.ticks_ms()
+    while time.ticks_diff(time.ticks_ms(), t0) < ms:
+        _led_tick()
+        await asyncio.sleep_ms(LED_TICK_MS)
+
+
+def _wifi_no_powersave(wlan):
+    # Modem sleep delays every packet to the next beacon, which dominates
+    # request latency; the board is mains powered, so stay awake instead.
+    try:
+        wlan.config(pm=wlan.PM_NONE)
+    except Exception:
+        pass
+
+
+async def connect_wifi_async(ssid, password, timeout_s=20):
     wlan = network.WLAN(network.WLAN.IF_STA)
     wlan.active(True)
 
     if wlan.isconnected():
+        _wifi_no_powersave(wlan)
         return wlan
 
     wlan.connect(ssid, password)
     t0 = time.ticks_ms()
     while not wlan.isconnected():
-        _led_tick()
         if time.ticks_diff(time.ticks_ms(), t0) > timeout_s * 1000:
             raise RuntimeError("Wi-Fi connect timeout")
-        time.sleep(0.2)
+        # LED ticks every LED_TICK_MS; link state checked every WIFI_POLL_MS
+        await led_sleep_ms(WIFI_POLL_MS)
 
+    _wifi_no_powersave(wlan)
     return wlan
 
 
-def _http_get_json(url):
-    r = requests.get(url)
+def connect_wifi(ssid, password, timeout_s=20):
+    return asyncio.run(connect_wifi_async(ssid, password, timeout_s))
+
+
+async def _get_json(session, url, etag=None, last_modified=None):
+    """
+    Conditional GET of a JSON document over an http11.AsyncSession.
+    Returns (obj, headers); obj is None when the server answers 304 Not Modified.
+    """
+    headers = {}
+    if deflate:
+        headers["Accept-Encoding"] = "gzip"
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    # Read the body into one bytearray, close the socket, then parse that
+    # buffer, so the raw body and the parsed dict are never both duplicated.
+    gc.collect()
+    r = await session.get(url, headers=headers)
     try:
+        hdrs = r.headers
+        if r.status_code == 304:
+            return None, hdrs
         if r.status_code != 200:
             raise RuntimeError("HTTP %d for %s" % (r.status_code, url))
-        return r.json()
+        clen = hdrs.get("content-length")
+        if clen is not None:
+            # Known size: read straight into an exact-size buffer, no regrowth.
+            body = bytearray(int(clen))
+            mv = memoryview(body)
+            got = 0
+            while got < len(body):
+                n = await r.readinto(mv[got:])
+                if not n:
+                    raise OSError("Short read for %s" % url)
+                got += n
+        else:
+            body = bytearray()
+            buf = bytearray(1024)
+            mv = memoryview(buf)
+            while True:
+                n = await r.readinto(buf)
+                if not n:
+                    break
+                body.extend(mv[:n])
+            del buf
+        del mv
     finally:
+        await r.close()
+
+    if hdrs.get("content-encoding", "").lower() == "gzip":
+        body = deflate.DeflateIO(io.BytesIO(body), deflate.GZIP).read()
+
+    obj = json.loads(body)
+    del body
+    gc.collect()
+    return obj, hdrs
+
+
+def _alloc_buf(size=CHUNK_SIZE):
+    """One reusable stream buffer; drops to MIN_CHUNK_SIZE if size won't fit."""
+    try:
+        return bytearray(size)
+    except MemoryError:
+        gc.collect()
+        return bytearray(MIN_CHUNK_SIZE)
+
+
+def _file_size(path):
+    try:
+        return os.stat(path)[6]
+    except OSError:
+        return 0
+
+
+@micropython.native
+def _pump(src, fo, h, buf):
+    """readinto -> write (fo may be None) -> hash (h may be None) until EOF."""
+    mv = memoryview(buf)
+    while True:
+        _led_tick()
+        n = src.readinto(buf)
+        if not n:
+            break
+        if fo:
+            fo.write(mv[:n])
+        if h:
+            h.update(mv[:n])
+
+
+def _hash_existing(path, h, buf):
+    with open(path, "rb") as f:
+        _pump(f, None, h, buf)
+
+
+def _local_sha256(path, buf):
+    """SHA-256 (hex) of a file already on flash, or None if it doesn't exist."""
+    h = _sha256()
+    try:
+        _hash_existing(path, h, buf)
+    except OSError:
+        return None
+    return ubinascii.hexlify(h.digest()).decode().lower()
+
+
+def _copy_file(src, dest_path, buf, h=None):
+    with open(src, "rb") as fi, open(dest_path, "wb") as fo:
+        _pump(fi, fo, h, buf)
+
+
+def _verify_sha256(path, expected, buf):
+    return _local_sha256(path, buf) == expected
+
+
+def _gunzip_file(src, dest_path, buf, h=None):
+    with open(src, "rb") as fi, open(dest_path, "wb") as fo:
+        _pump(deflate.DeflateIO(fi, deflate.GZIP), fo, h, buf)
+
+
+class _HttpStatusError(RuntimeError):
+    def __init__(self, status, url, retry_after=None):
+        super().__init__("HTTP %d for %s" % (status, url))
+        self.status = status
+        self.retry_after = retry_after  # seconds, from a 429/503 Retry-After
+
+
+def _retry_after_s(hdrs):
+    try:
+        return int(hdrs.get("retry-after", ""))
+    except ValueError:
+        return None  # absent, or an HTTP-date: use the jittered backoff
+
+
+def _next_retry_sleep(prev_s):
+    """Decorrelated jitter: uniform in [min, 3 * prev], capped."""
+    hi = min(RETRY_SLEEP_MAX_S, prev_s * 3)
+    return RETRY_SLEEP_MIN_S + (hi - RETRY_SLEEP_MIN_S) * random.getrandbits(8) / 256
+
+
+def _remove_partials(dest_path):
+    for p in (dest_path + ".part", dest_path + ".gz", dest_path + ".val"):
         try:
-            r.close()
-        except Exception:
+            os.remove(p)
+        except OSError:
             pass
 
 
-def _sha256_stream_to_file(resp, dest_path):
-    h = hashlib.sha256()
+def _load_validator(dest_path):
+    """(validator, encoding) saved next to a partial download, or (None, None)."""
+    try:
+        with open(dest_path + ".val") as f:
+            v, enc = f.read().split("\n", 1)
+        return v, enc.strip()
+    except (OSError, ValueError):
+        return None, None
+
+
+def _save_validator(dest_path, hdrs, gz):
+    # If-Range needs a strong ETag or a Last-Modified date. Without either,
+    # no .val is kept and an interrupted download starts over.
+    etag = hdrs.get("etag", "")
+    v = etag if etag and not etag.startswith("W/") else hdrs.get("last-modified", "")
+    if not v:
+        try:
+            os.remove(dest_path + ".val")
+        except OSError:
+            pass
+        return
+    with open(dest_path + ".val", "w") as f:
+        f.write("%s\n%s" % (v, "gzip" if gz else "identity"))
 
-    parent = dest_path.rsplit("/", 1)[0]
-    if parent:
-        _mkdirs(parent)
 
-    raw = getattr(resp, "raw", None)
-    with open(dest_path, "wb") as f:
-        if raw and hasattr(raw, "read"):
-            while True:
-                _led_tick()
-                chunk = raw.read(CHUNK_SIZE)
-                if not chunk:
-                    break
-                h.update(chunk)
-                f.write(chunk)
+async def _download_to_file(session, url, dest_path, buf, want_hash=False):
+    """
+    Downloads url into <dest>.part; the caller renames it once verified. If a
+    partial download is already on flash, only the missing tail is requested
+    (Range + If-Range) and appended. The parent directory must already exist
+    (_make_staging_dirs).
+    A partial is only resumed when its ETag/Last-Modified and encoding were
+    saved in <dest>.val and a hash will check the result (want_hash);
+    otherwise, or if the server's file or encoding changed, it starts over.
+    With deflate available the file is fetched gzip-encoded into
+    <dest>.gz (which is what gets resumed) and inflated once complete.
+
+    With want_hash, a file written in one pass (fresh download or inflate) is
+    hashed as it is written and the hex digest returned. A resumed file
+    returns None and is hashed from flash afterwards.
+    """
+    mv = memoryview(buf)
+    part_path = dest_path + ".part"
+    gz_path = dest_path + ".gz"
+
+    have_gz = _file_size(gz_path)
+    have = 0 if have_gz else _file_size(part_path)
+
+    validator, enc = _load_validator(dest_path) if want_hash else (None, None)
+    if (have_gz or have) and (validator is None or enc != ("gzip" if have_gz else "identity")):
+        _remove_partials(dest_path)
+        have_gz = have = 0
+
+    headers = {}
+    if have_gz or have:
+        headers["Range"] = "bytes=%d-" % (have_gz or have)
+        headers["If-Range"] = validator  # changed upstream => full 200 instead
+        headers["Accept-Encoding"] = "gzip" if have_gz else "identity"
+    elif deflate:
+        headers["Accept-Encoding"] = "gzip"
+
+    gc.collect()  # start each body with a compacted heap (TLS records are large)
+    r = await session.get(url, headers=headers)
+    try:
+        gz = r.headers.get("content-encoding", "").lower() == "gzip"
+        if r.status_code == 416:
+            # No Content-Encoding on a 416: the partial on flash decides.
+            gz = bool(have_gz)
+        partial = have_gz if gz else have
+        target = gz_path if gz else part_path
+
+        if r.status_code == 200:
+            mode = "wb"  # fresh download, or the file changed since the partial
+            _save_validator(dest_path, r.headers, gz)
+        elif r.status_code == 206:
+            etag = r.headers.get("etag", "")
+            if not partial or (etag and validator.startswith('"') and etag != validator):
+                # Other encoding or another version of the file: the tail
+                # can't be appended. Start from zero on the next attempt.
+                _remove_partials(dest_path)
+                raise RuntimeError("Range reply does not match partial %s" % dest_path)
+            mode = "ab"
+        elif r.status_code == 416 and partial:
+            mode = None  # nothing left to fetch; verification decides if it's good
+        elif r.status_code in (429, 503):
+            raise _HttpStatusError(r.status_code, url, _retry_after_s(r.headers))
         else:
-            data = resp.content
-            h.update(data)
-            f.write(data)
+            raise _HttpStatusError(r.status_code, url)
+
+        # Hash, write and read share one loop so each block is touched once.
+        # This hash context spans awaits; if another worker's context holds
+        # the SHA engine, mbedtls computes this one in software instead.
+        h = _sha256() if want_hash and mode == "wb" and not gz else None
+
+        # File writes never await, so concurrent workers cannot interleave
+        # inside them: flash access stays single-writer.
+        if mode:
+            with open(target, mode) as f:
+                while True:
+                    _led_tick()
+                    n = await r.readinto(buf)
+                    if not n:
+                        break
+                    f.write(mv[:n])
+                    if h:
+                        h.update(mv[:n])
+    finally:
+        await r.close()
+    del r
 
-    return ubinascii.hexlify(h.digest()).decode().lower()
+    if gz:
+        h = _sha256() if want_hash else None
+        _gunzip_file(gz_path, part_path, buf, h)
+    if have_gz or gz:
+        try:
+            os.remove(gz_path)
+        except OSError:
+            pass
+
+    return ubinascii.hexlify(h.digest()).decode().lower() if h else None
 
 
-def _download(url, dest_path, expected_sha256, retries=2):
+async def _download(session, url, dest_path, expected_sha256, buf, retries=2):
     """
     Download file; if _verify_sha is True and expected_sha256 is non-empty, verify it.
+    The file only appears under dest_path once verified; until then it is
+    <dest>.part. A failed attempt leaves the partial file in place so the
+    retry, or the next run once retries are used up, resumes it; only a
+    SHA or validator mismatch discards it.
     """
     expected = (expected_sha256 or "").strip().lower()
+    check = _verify_sha and expected
     last_err = None
+    sleep_s = RETRY_SLEEP_MIN_S
+
+    # Already staged by an earlier (interrupted) run of the same version.
+    if _file_size(dest_path):
+        if not check or _local_sha256(dest_path, buf) == expected:
+            return
+        os.remove(dest_path)
 
     for attempt in range(retries + 1):
         try:
             _led_tick()
-            r = requests.get(url)
-            try:
-                if r.status_code != 200:
-                    raise RuntimeError("HTTP %d for %s" % (r.status_code, url))
-                got = _sha256_stream_to_file(r, dest_path)
-            finally:
-                try:
-                    r.close()
-                except Exception:
-                    pass
+            digest = await _download_to_file(session, url, dest_path, buf, want_hash=check)
 
-            if _verify_sha and expected:
-                if got != expected:
-                    try:
-                        os.remove(dest_path)
-                    except OSError:
-                        pass
+            if check:
+                if digest is None:
+                    digest = _local_sha256(dest_path + ".part", buf)
+                if digest != expected:
+                    _remove_partials(dest_path)
                     raise RuntimeError("SHA256 mismatch for %s" % dest_path)
 
+            os.rename(dest_path + ".part", dest_path)
+            _remove_partials(dest_path)  # leftover .val
             return
 
         except Exception as e:
             last_err = e
+            if attempt == retries:
+                break
+            # Jittered so a fleet updating at once doesn't retry in lockstep;
+            # a server-sent Retry-After wins.
+            sleep_s = _next_retry_sleep(sleep_s)
+            ra = getattr(e, "retry_after", None)
+            await asyncio.sleep(min(ra, RETRY_SLEEP_MAX_S) if ra is not None else sleep_s)
+
+    # Transport errors leave the partial for the next run to resume; mismatches
+    # have already discarded it.
+    raise last_err
+
+
+def _root_sha256(files):
+    """SHA-256 (hex) over "path\nsha256\n" for each manifest entry, in order."""
+    h = _sha256()
+    for f in files:
+        h.update(f["path"].encode())
+        h.update(b"\n")
+        h.update(f.get("sha256", "").strip().lower().encode())
+        h.update(b"\n")
+    return ubinascii.hexlify(h.digest()).decode().lower()
+
+
+def _installed_hashes():
+    """{path: sha256} recorded for the installed app, or {} if none was saved."""
+    m = _load_json("/app/" + INSTALLED_MANIFEST, {})
+    return {f["path"].lstrip("/"): f["sha256"] for f in m.get("files", []) if f.get("sha256")}
+
+
+def _save_installed_manifest(manifest):
+    files = [{"path": f["path"], "sha256": f.get("sha256", "")} for f in manifest.get("files", [])]
+    _save_json("/next/" + INSTALLED_MANIFEST, {"version": manifest["version"], "files": files})
+
+
+def _reuse_installed(rel, expected_sha256, buf, installed):
+    """
+    Copies /app/<rel> into /next if it already matches the manifest hash.
+    Returns True if the download can be skipped. /app itself is left intact so
+    the swap stays all-or-nothing.
+
+    When the installed manifest already lists the same hash, the source is not
+    hashed again; the copy is hashed as it is written either way.
+    """
+    expected = (expected_sha256 or "").strip().lower()
+    if not expected:
+        return False
+    src = "/app/" + rel
+    if installed.get(rel) != expected and not _verify_sha256(src, expected, buf):
+        return False
+    dest = "/next/" + rel
+    h = _sha256()
+    try:
+        _copy_file(src, dest + ".part", buf, h)
+    except OSError:
+        return False  # listed but missing on flash
+    if ubinascii.hexlify(h.digest()).decode().lower() != expected:
+        _remove_partials(dest)
+        return False
+    os.rename(dest + ".part", dest)
+    return True
+
+
+async def _download_worker(pending, counts, installed, session=None):
+    # Each worker owns one keep-alive connection and one stream buffer.
+    if session is None:
+        session = http11.AsyncSession()
+    buf = _alloc_buf()
+    try:
+        while pending:
+            item = pending.pop(0)
+            rel = item["path"].lstrip("/")
+            sha = item.get("sha256", "")
+            if _reuse_installed(rel, sha, buf, installed):
+                counts[1] += 1
+                continue
+            await _download(session, item["url"], "/next/" + rel, sha, buf, retries=2)
+            counts[0] += 1
+            del item
+            gc.collect()  # free the finished file's response before the next one
+    finally:
+        await session.close()
+
+
+async def _download_all(files, installed, session=None):
+    """
+    Returns (downloaded, reused) file counts. session, if given, is handed to
+    the first worker so an already open connection is reused.
+    """
+    pending = list(files)
+    counts = [0, 0]
+    n = max(1, min(OTA_PARALLEL, len(pending)))
+    workers = [_download_worker(pending, counts, installed, session)]
+    workers += [_download_worker(pending, counts, installed) for _ in range(n - 1)]
+    tasks = [asyncio.create_task(w) for w in workers]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # If one worker failed, stop the rest; each closes its connection on
+        # the way out. Wait for that before the error propagates.
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+        for t in tasks:
             try:
-                os.remove(dest_path)
-            except OSError:
+                await t
+            except (Exception, asyncio.CancelledError):
                 pass
-            time.sleep(0.5 + 0.5 * attempt)
-
-    raise last_err
+    return counts[0], counts[1]
 
 
 def load_state():
     return _load_json(
         STATE_PATH,
-        {"installed_version": "0.0.0", "boot_failures": 0, "pending_version": None},
+        {
+            "installed_version": "0.0.0",
+            "boot_failures": 0,
+            "pending_version": None,
+            "staging_version": None,
+        },
     )
 
 
+# Keys save_state() knows how to format by hand; anything else goes through
+# json.dump.
+_STATE_INT_KEYS = ("boot_failures",)
+_STATE_STR_KEYS = (
+    "installed_version", "pending_version", "staging_version",
+    "manifest_etag", "manifest_lastmod",
+)
+
+
+def _json_str(v):
+    if v is None:
+        return "null"
+    return '"%s"' % v.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _write_state(st):
+    """
+    Formats the fixed-shape state dict with one % per field instead of
+    json.dump's many small writes. Returns False if st has anything else.
+    """
+    parts = []
+    for k, v in st.items():
+        if k in _STATE_INT_KEYS and isinstance(v, int):
+            parts.append('"%s": %d' % (k, v))
+        elif k in _STATE_STR_KEYS and (v is None or isinstance(v, str)):
+            parts.append('"%s": %s' % (k, _json_str(v)))
+        else:
+            return False
+    with open(STATE_PATH, "w") as f:
+        f.write("{" + ", ".join(parts) + "}")
+    return True
+
+
 def save_state(st):
-    _save_json(STATE_PATH, st)
+    if not _write_state(st):
+        _save_json(STATE_PATH, st)
+
+
+def _rtc_failures():
+    """Boot failure counter from RTC memory, or None after power loss."""
+    try:
+        mem = machine.RTC().memory()
+    except Exception:
+        return None
+    if len(mem) >= 3 and mem[:2] == _RTC_MAGIC:
+        return mem[2]
+    return None
+
+
+def _set_rtc_failures(n):
+    try:
+        machine.RTC().memory(_RTC_MAGIC + bytes([min(int(n), 255)]))
+    except Exception:
+        pass
+
+
+def boot_failures(st=None):
+    n = _rtc_failures()
+    if n is not None:
+        return n
+    if st is None:
+        st = load_state()
+    return int(st.get("boot_failures", 0))
+
+
+def note_boot_attempt(max_failures=MAX_BOOT_FAILURES):
+    """
+    Count a boot attempt before starting the app.
+    After a warm reset the counter lives in RTC memory only; /state.json is
+    written on a cold boot (RTC memory lost) or once the rollback threshold is
+    reached, so the count still survives a power cycle when it matters.
+    """
+    n = _rtc_failures()
+    cold = n is None
+    st = None
+    if cold:
+        st = load_state()
+        n = int(st.get("boot_failures", 0))
+    n += 1
+    _set_rtc_failures(n)
+
+    if cold or n >= max_failures:
+        if st is None:
+            st = load_state()
+        st["boot_failures"] = n
+        save_state(st)
+    return n
 
 
 def mark_boot_success():
+    _set_rtc_failures(0)
     st = load_state()
+    if int(st.get("boot_failures", 0)) == 0 and st.get("pending_version") is None:
+        return
     st["boot_failures"] = 0
     st["pending_version"] = None
     save_state(st)
 
 
-def maybe_rollback(max_failures=3):
+def maybe_rollback(max_failures=MAX_BOOT_FAILURES):
     st = load_state()
-    if int(st.get("boot_failures", 0)) < max_failures:
+    if boot_failures(st) < max_failures:
         return False
 
     try:
@@ -236,29 +797,43 @@ def maybe_rollback(max_failures=3):
     st["boot_failures"] = 0
     st["pending_version"] = None
     save_state(st)
+    _set_rtc_failures(0)
 
     machine.reset()
     return True
 
 
-def apply_update(manifest):
+def apply_update(manifest, validators=None):
+    asyncio.run(_apply_update(manifest, validators))
+
+
+async def _apply_update(manifest, validators=None, session=None):
     new_ver = manifest["version"]
     files = manifest.get("files", [])
     if not files:
         raise RuntimeError("Manifest has no files")
 
-    _rmtree("/next")
-    try:
-        os.mkdir("/next")
-    except OSError:
-        pass
+    # Optional whole-bundle digest: the per-file hashes are only as good as the
+    # list they came in. Checked before anything is staged or swapped.
+    root = manifest.get("root_sha256", "").strip().lower()
+    if root and _root_sha256(files) != root:
+        raise RuntimeError("Manifest root_sha256 mismatch for %s" % new_ver)
 
-    for item in files:
-        rel = item["path"].lstrip("/")
-        url = item["url"]
-        sha = item.get("sha256", "")
-        dest = "/next/" + rel
-        _download(url, dest, sha, retries=2)
+    # Keep a half-staged /next for the same version (e.g. power loss mid-OTA):
+    # its partial files are resumed rather than downloaded again.
+    st = load_state()
+    if st.get("staging_version") != new_ver:
+        _rmtree("/next")
+        st["staging_version"] = new_ver
+        save_state(st)
+    _make_staging_dirs(files)
+
+    # A few keep-alive connections download the bundle concurrently, so the
+    # per-file round trips overlap instead of adding up.
+    downloaded, reused = await _download_all(files, _installed_hashes(), session)
+    print("OTA %s: %d file(s) downloaded, %d unchanged" % (new_ver, downloaded, reused))
+    _save_installed_manifest(manifest)
+    gc.collect()
 
     _rmtree("/app_prev")
     try:
@@ -270,21 +845,59 @@ def apply_update(manifest):
     st = load_state()
     st["installed_version"] = new_ver
     st["pending_version"] = new_ver
+    st["staging_version"] = None
     st["boot_failures"] = 0
+    if validators:
+        st.update(validators)
     save_state(st)
+    _set_rtc_failures(0)
 
     machine.reset()
 
 
-def check_and_update(manifest_url):
+def check_and_update(manifest_url, use_etag=True):
+    return asyncio.run(_check_and_update(manifest_url, use_etag))
+
+
+async def _check_and_update(manifest_url, use_etag):
+    # One keep-alive session carries the manifest and then the first download
+    # worker, so a bundle on the manifest's host skips a TLS handshake.
+    session = http11.AsyncSession()
+    try:
+        return await _check_with(session, manifest_url, use_etag)
+    finally:
+        await session.close()
+
+
+async def _check_with(session, manifest_url, use_etag):
     st = load_state()
-    manifest = _http_get_json(manifest_url)
+
+    # Conditional GET: an unchanged manifest costs a 304 and no JSON parse.
+    # use_etag=False always fetches the full manifest (e.g. a host whose
+    # validators are unreliable).
+    if use_etag:
+        manifest, hdrs = await _get_json(
+            session, manifest_url, st.get("manifest_etag"), st.get("manifest_lastmod")
+        )
+        if manifest is None:
+            return False
+    else:
+        manifest, hdrs = await _get_json(session, manifest_url)
+
+    validators = {
+        "manifest_etag": hdrs.get("etag"),
+        "manifest_lastmod": hdrs.get("last-modified"),
+    }
 
     new_ver = manifest.get("version", "0.0.0")
     cur_ver = st.get("installed_version", "0.0.0")
 
     if _parse_ver(new_ver) <= _parse_ver(cur_ver):
+        # Nothing to install; remember the validators for the next boot.
+        if any(st.get(k) != v for k, v in validators.items()):
+            st.update(validators)
+            save_state(st)
         return False
 
-    apply_update(manifest)
-    return True
\ No newline at end of file
+    await _apply_update(manifest, validators, session)
+    return True
@@ -0,0 +1,561 @@
+import sys
+import time
+import json
+import socket
+import select
+import ntptime
+import updater
+
+# Ensure /app/lib is importable
+if "/app/lib" not in sys.path:
+    sys.path.insert(0, "/app/lib")
+
+try:
+    from web.server import WebServer  # noqa: E402
+    _WEB_IMPORT_ERROR = None
+except Exception as e:
+    WebServer = None
+    _WEB_IMPORT_ERROR = repr(e)
+from ngenic.ngenic_client import NgenicClient  # noqa: E402
+from spotprice.elprisetjustnu import SpotPriceClient, day_to_slots  # noqa: E402
+from scheduler import compute_recommendations  # noqa: E402
+
+from apiutil import response_envelope, clamp_int  # noqa: E402
+from timeutil import pack_time  # noqa: E402
+
+from weather.smhi_snow1g import SmhiSnow1gClient  # noqa: E402
+from solar.openmeteo import OpenMeteoSolarClient  # noqa: E402
+from weather.metno_locationforecast import MetNoLocationForecastClient  # noqa: E402
+from pv import build_pv_hourly_series  # noqa: E402
+
+
+APP_VERSION = "0.6.6"
+
+# Single-site installation:
+SITE_LAT = 60.04333
+SITE_LON = 17.54466
+
+# PV geometry:
+# Open-Meteo azimuth convention: 0° = South, -90° = East, 90° = West, ±180° = North
+PV_KWP = 9.7
+PV_TILT_DEG = 20.0
+PV_AZIMUTH_DEG = 0.0  # due south
+
+SYNC_INTERVAL_MS = 60 * 60 * 1000  # 1 hour
+
+# Longest the main loop sleeps waiting for a client before it runs the
+# refresh checks again (Ngenic wants roughly once a second).
+IDLE_WAIT_MS = 1000
+
+
+def _r2(x):
+    if x is None:
+        return None
+    try:
+        return round(float(x), 2)
+    except Exception:
+        return None
+
+
+class _NoopNgenicClient:
+    def __init__(self, reason):
+        self._reason = reason
+        self.version = 0
+        self._cache = {
+            "import_kW": None,
+            "export_kW": None,
+            "net_kW": None,
+            "age_s": None,
+            "learned_interval_s": None,
+            "ok": False,
+            "import_time": None,
+            "export_time": None,
+            "updated_epoch": None,
+            "ngenic_time_changed_epoch": None,
+            "last_error": reason,
+        }
+
+    def get_cached(self):
+        return dict(self._cache)
+
+    def refresh_if_due(self, force=False):
+        return self.get_cached()
+
+
+_STATUS_LINES = {
+    200: b"HTTP/1.1 200 OK\r\n",
+    404: b"HTTP/1.1 404 Not Found\r\n",
+    500: b"HTTP/1.1 500 Internal Server Error\r\n",
+}
+
+
+def _http_response(status_code, content_type, body_bytes):
+    hdr = _STATUS_LINES.get(status_code, _STATUS_LINES[200]) + (
+        b"Content-Type: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n"
+        % (content_type.encode("utf-8"), len(body_bytes))
+    )
+    # Sent as two writes so the body is never copied into a joined buffer.
+    return hdr, body_bytes
+
+
+def _send(cl, resp):
+    hdr, body = resp
+    cl.sendall(hdr)
+    cl.sendall(body)
+
+
+class _FallbackWebServer:
+    def __init__(self, host="0.0.0.0", port=80, reason=""):
+        self._reason = reason or "fallback server"
+        self._sock = socket.socket()
+        try:
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        except Exception:
+            pass
+
+        addr = None
+        try:
+            addr = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][-1]
+        except Exception:
+            addr = (host, port)
+
+        self._sock.bind(addr)
+        self._sock.listen(1)
+        self._sock.settimeout(0.2)
+        self._poller = select.poll()
+        self._poller.register(self._sock, select.POLLIN)
+
+    def close(self):
+        try:
+            self._sock.close()
+        except Exception:
+            pass
+
+    def wait(self, timeout_ms):
+        """True once a client is waiting to be accepted, False on timeout."""
+        return bool(self._poller.poll(timeout_ms))
+
+    def poll_once(self, handlers):
+        try:
+            cl, _addr = self._sock.accept()
+        except OSError:
+            return
+
+        try:
+            cl.settimeout(1.0)
+            req = cl.recv(512)
+            line = req.split(b"\r\n", 1)[0].decode("utf-8", "ignore") if req else ""
+            parts = line.split(" ")
+            path = parts[1] if len(parts) > 1 else "/"
+
+            if path.startswith("/api/status") and "/api/status" in handlers:
+                payload = handlers["/api/status"]({})
+                body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+                _send(cl, _http_response(200, "application/json; charset=utf-8", body))
+                return
+
+            body = (
+                "<html><body><h1>ESP32-C6 Energy Hub</h1>"
+                "<p>Fallback web server active.</p>"
+                "<p class='mono'>%s</p>"
+                "</body></html>" % self._reason
+            ).encode("utf-8")
+            _send(cl, _http_response(200, "text/html; charset=utf-8", body))
+        except Exception:
+            try:
+                _send(cl, _http_response(500, "text/plain; charset=utf-8", b"Server error"))
+            except Exception:
+                pass
+        finally:
+            try:
+                cl.close()
+            except Exception:
+                pass
+
+
+def _start_server():
+    errors = []
+    if WebServer is not None:
+        try:
+            return WebServer(port=80), 80
+        except Exception as e:
+            errors.append("WebServer(80): " + repr(e))
+            print("WebServer init failed:", repr(e))
+    else:
+        errors.append("web import: " + str(_WEB_IMPORT_ERROR))
+        print("Web server import failed:", _WEB_IMPORT_ERROR)
+
+    for p in (80, 8080):
+        try:
+            reason = "; ".join(errors) if errors else "fallback requested"
+            return _FallbackWebServer(port=p, reason=reason), p
+        except Exception as e:
+            errors.append("Fallback(%d): %r" % (p, e))
+
+    raise RuntimeError("Cannot start HTTP server: " + "; ".join(errors))
+
+
+try:
+    # The launcher's secrets.py parses /secrets.json once per boot; share it.
+    from secrets import get_secrets as load_secrets  # noqa: E402
+except ImportError:
+    _secrets = None
+
+    def load_secrets():
+        # Older launcher without secrets.py: cache the parsed file here instead.
+        global _secrets
+        if _secrets is None:
+            with open("/secrets.json", "r") as f:
+                _secrets = json.load(f)
+        return _secrets
+
+
+def wifi_up():
+    sec = load_secrets()
+    wlan = updater.connect_wifi(sec["wifi_ssid"], sec["wifi_password"], timeout_s=20)
+    return wlan.ifconfig()[0]
+
+
+def sync_time():
+    # Keep 0.5.1 behaviour: ensure Wi-Fi before NTP.
+    wifi_up()
+    ntptime.settime()  # sets UTC (device epoch)
+
+
+def _norm_ngenic(st):
+    updated = st.get("updated_epoch")
+    changed = st.get("ngenic_time_changed_epoch")
+    return {
+        "import_kW": _r2(st.get("import_kW")),
+        "export_kW": _r2(st.get("export_kW")),
+        "net_kW": _r2(st.get("net_kW")),
+        "age_s": st.get("age_s"),
+        "learned_interval_s": _r2(st.get("learned_interval_s")),
+        "ok": bool(st.get("ok")),
+        "import_time": st.get("import_time"),
+        "export_time": st.get("export_time"),
+        "updated": pack_time(updated) if updated is not None else None,
+        "upstream_changed": pack_time(changed) if changed is not None else None,
+    }
+
+
+def _norm_prices(cache, now):
+    out = {
+        "area": cache.get("area"),
+        "today_ymd": cache.get("today_ymd"),
+        "tomorrow_ymd": cache.get("tomorrow_ymd"),
+        "tomorrow_status": cache.get("tomorrow_status"),
+        "cache_age_s": cache.get("age_s"),
+        "fetched": pack_time(cache["fetched_epoch"]) if cache.get("fetched_epoch") is not None else None,
+        "current": {"sek_per_kwh": None, "slot": None},
+        "days": cache.get("days") or {},
+    }
+
+    days = out["days"]
+    cur_slot = None
+    cur_price = None
+    for _ymd, day in days.items():
+        try:
+            starts = day["start_utc"]
+            ends = day["end_utc"]
+            for i in range(len(starts)):
+                if starts[i] <= int(now) < ends[i]:
+                    cur_slot = {"start": pack_time(starts[i]), "end": pack_time(ends[i])}
+                    cur_price = day["sek"][i]
+                    break
+        except Exception:
+            continue
+        if cur_slot is not None:
+            break
+    out["days"] = {ymd: day_to_slots(d) for ymd, d in days.items()}
+
+    out["current"]["sek_per_kwh"] = cur_price
+    out["current"]["slot"] = cur_slot
+    return out
+
+
+def _json_memo(memo, key, build):
+    """
+    JSON bytes for build(), reused while key is unchanged. Keys include the
+    current second since responses carry second-resolution timestamps.
+    """
+    if memo.get("key") != key:
+        memo["body"] = None  # drop the old body before building the new one
+        memo["body"] = json.dumps(build()).encode("utf-8")
+        memo["key"] = key
+    return memo["body"]
+
+
+def main():
+    ip = None
+    http_port = None
+    last_ntp_sync_epoch = None
+
+    try:
+        ip = wifi_up()
+        print("Energy Hub UI: http://%s/" % ip)
+    except Exception as e:
+        print("Wi-Fi failed:", repr(e))
+
+    try:
+        sync_time()
+        last_ntp_sync_epoch = int(time.time())
+    except Exception as e:
+        print("NTP sync failed:", repr(e))
+
+    secrets = {}
+    try:
+        secrets = load_secrets()
+    except Exception:
+        secrets = {}
+
+    try:
+        ng = NgenicClient(secrets=load_secrets())
+    except Exception as e:
+        reason = "ngenic disabled: " + repr(e)
+        print(reason)
+        ng = _NoopNgenicClient(reason)
+
+    prices = SpotPriceClient(area="SE3")
+    prices.load_cache()
+    try:
+        prices.refresh_if_due()
+    except Exception as e:
+        print("Spot price startup refresh failed:", repr(e))
+
+    smhi = SmhiSnow1gClient(
+        lat=SITE_LAT,
+        lon=SITE_LON,
+        parameters=["air_temperature", "wind_speed"],
+        timeseries=48,
+    )
+    smhi.load_cache()
+    try:
+        smhi.refresh_if_due()
+    except Exception as e:
+        print("SMHI startup refresh failed:", repr(e))
+
+    solar = OpenMeteoSolarClient(
+        lat=SITE_LAT,
+        lon=SITE_LON,
+        tilt_deg=PV_TILT_DEG,
+        azimuth_deg=PV_AZIMUTH_DEG,
+        forecast_hours=36,
+    )
+    solar.load_cache()
+    try:
+        solar.refresh_if_due()
+    except Exception as e:
+        print("Solar startup refresh failed:", repr(e))
+
+    metno = MetNoLocationForecastClient(
+        lat=SITE_LAT,
+        lon=SITE_LON,
+        user_agent=secrets.get("metno_user_agent"),
+    )
+    metno.load_cache()
+    try:
+        metno.refresh_if_due()
+    except Exception as e:
+        print("MET Norway startup refresh failed:", repr(e))
+
+    srv, http_port = _start_server()
+    print("HTTP server listening on port", http_port)
+    if ip:
+        if int(http_port) == 80:
+            print("Energy Hub UI: http://%s/" % ip)
+        else:
+            print("Energy Hub UI: http://%s:%d/" % (ip, int(http_port)))
+    # Only mark boot successful after core services are initialised.
+    updater.mark_boot_success()
+    last_sync_ms = time.ticks_ms()
+
+    status_memo = {}
+    prices_memo = {}
+    reco_memo = {}
+
+    def build_status(now):
+        data = {
+            "device_time": pack_time(now),
+            "ip": ip,
+            "http_port": http_port,
+            "last_ntp_sync": pack_time(last_ntp_sync_epoch) if last_ntp_sync_epoch else None,
+            "site": {"lat": SITE_LAT, "lon": SITE_LON},
+            "pv": {"kwp": PV_KWP, "tilt_deg": PV_TILT_DEG, "azimuth_deg": PV_AZIMUTH_DEG},
+            "ngenic": _norm_ngenic(ng.get_cached()),
+        }
+        return response_envelope(data, app_version=APP_VERSION, now_epoch=now, endpoint="/api/status")
+
+    def build_prices(now):
+        data = _norm_prices(prices.get_cached(), now)
+        return response_envelope(data, app_version=APP_VERSION, now_epoch=now, endpoint="/api/prices")
+
+    # The UI polls these from every open tab; serialize once per data change
+    # and second rather than once per request (recommendations below too).
+    def api_status(_q):
+        now = int(time.time())
+        key = (now, ng.version, last_ntp_sync_epoch)
+        return _json_memo(status_memo, key, lambda: build_status(now))
+
+    def api_prices(_q):
+        now = int(time.time())
+        return _json_memo(prices_memo, (now, prices.version), lambda: build_prices(now))
+
+    def build_recommendations(now):
+        pv_rows = build_pv_hourly_series(
+            smhi.get_hourly_series(hours=24, utc_epoch=now),
+            solar.get_hourly_series(hours=24, utc_epoch=now),
+            kwp=PV_KWP,
+            loss_factor=0.86,
+        )
+        reco = compute_recommendations(
+            prices.get_cached(),
+            now,
+            ngenic_cache=ng.get_cached(),
+            pv_series=pv_rows,
+        )
+        return response_envelope(reco, app_version=APP_VERSION, now_epoch=now, endpoint="/api/recommendations")
+
+    def api_recommendations(_q):
+        now = int(time.time())
+        key = (now, prices.version, ng.version)
+        return _json_memo(reco_memo, key, lambda: build_recommendations(now))
+
+    def api_weather_hourly(q):
+        now = int(time.time())
+        hours = clamp_int(q.get("hours"), 1, 72, 24)
+        smhi_series = smhi.get_hourly_series(hours=hours, utc_epoch=now)
+        metno_series = metno.get_hourly_series(hours=hours, utc_epoch=now)
+
+        data = {
+            "location": {"lat": SITE_LAT, "lon": SITE_LON},
+            "hours": hours,
+            "primary": {
+                "provider": smhi.get_cached().get("provider"),
+                "referenceTime": smhi.get_cached().get("referenceTime"),
+                "createdTime": smhi.get_cached().get("createdTime"),
+                "ok": smhi.get_cached().get("ok"),
+                "series": [
+                    {"start": pack_time(it["start_epoch"]), "end": pack_time(it["end_epoch"]), "values": it.get("values") or {}}
+                    for it in smhi_series
+                ],
+            },
+            "fallback": {
+                "provider": metno.get_cached().get("provider"),
+                "ok": metno.get_cached().get("ok"),
+                "series": [
+                    {"start": pack_time(it["start_epoch"]), "end": pack_time(it["end_epoch"]), "values": it.get("values") or {}}
+                    for it in metno_series
+                ],
+            },
+            "units": {"t_air_c": "°C", "wind_mps": "m/s", "cloud_pct": "%"},
+        }
+        return response_envelope(data, app_version=APP_VERSION, now_epoch=now, endpoint="/api/weather_hourly")
+
+    def api_solar_hourly(q):
+        now = int(time.time())
+        hours = clamp_int(q.get("hours"), 1, 72, 24)
+        sol_series = solar.get_hourly_series(hours=hours, utc_epoch=now)
+
+        data = {
+            "location": {"lat": SITE_LAT, "lon": SITE_LON},
+            "hours": hours,
+            "provider": solar.get_cached().get("provider"),
+            "ok": solar.get_cached().get("ok"),
+            "tilt_deg": PV_TILT_DEG,
+            "azimuth_deg": PV_AZIMUTH_DEG,
+            "series": [
+                {"start": pack_time(it["start_epoch"]), "end": pack_time(it["end_epoch"]), "values": it.get("values") or {}}
+                for it in sol_series
+            ],
+            "units": {"gti_wm2": "W/m²", "ghi_wm2": "W/m²", "dni_wm2": "W/m²", "dhi_wm2": "W/m²"},
+        }
+        return response_envelope(data, app_version=APP_VERSION, now_epoch=now, endpoint="/api/solar_hourly")
+
+    def api_pv_hourly(q):
+        now = int(time.time())
+        hours = clamp_int(q.get("hours"), 1, 72, 24)
+
+        kwp = q.get("kwp")
+        try:
+            kwp = float(kwp) if kwp is not None else PV_KWP
+        except Exception:
+            kwp = PV_KWP
+
+        rows = build_pv_hourly_series(
+            smhi.get_hourly_series(hours=hours, utc_epoch=now),
+            solar.get_hourly_series(hours=hours, utc_epoch=now),
+            kwp=kwp,
+            loss_factor=0.86,
+        )
+
+        data = {
+            "location": {"lat": SITE_LAT, "lon": SITE_LON},
+            "hours": hours,
+            "assumptions": {"kwp": kwp, "loss_factor": 0.86},
+            "series": rows,
+            "units": {
+                "t_air_c": "°C",
+                "wind_mps": "m/s",
+                "gti_wm2": "W/m²",
+                "pv_kw_est_simple": "kW",
+                "pv_kwh_est_simple": "kWh",
+            },
+        }
+        return response_envelope(data, app_version=APP_VERSION, now_epoch=now, endpoint="/api/pv_hourly")
+
+    handlers = {
+        "/api/status": api_status,
+        "/api/prices": api_prices,
+        "/api/recommendations": api_recommendations,
+        "/api/weather_hourly": api_weather_hourly,
+        "/api/solar_hourly": api_solar_hourly,
+        "/api/pv_hourly": api_pv_hourly,
+    }
+
+    try:
+        while True:
+            # Sleep until a client connects or the idle tick is due, instead
+            # of waking 20 times a second. Serving the UI still comes first.
+            if srv.wait(IDLE_WAIT_MS):
+                srv.poll_once(handlers)
+
+            try:
+                ng.refresh_if_due()
+            except Exception:
+                pass
+
+            try:
+                prices.refresh_if_due()
+            except Exception:
+                pass
+
+            try:
+                smhi.refresh_if_due()
+            except Exception:
+                pass
+
+            try:
+                solar.refresh_if_due()
+            except Exception:
+                pass
+
+            try:
+                metno.refresh_if_due()
+            except Exception:
+                pass
+
+            if time.ticks_diff(time.ticks_ms(), last_sync_ms) >= SYNC_INTERVAL_MS:
+                try:
+                    sync_time()
+                    last_ntp_sync_epoch = int(time.time())
+                    last_sync_ms = time.ticks_ms()
+                    print("Time re-synchronised (NTP).")
+                except Exception:
+                    pass
+    finally:
+        srv.close()
+
+
+main()
+
@@ -0,0 +1,348 @@
+# ngenic_client.py
+# Ngenic Tune API v3 client (instantaneous import/export power) using HTTP/1.1 TLS.
+#
+# Adaptive polling strategy:
+# - Empirically, Ngenic "latest" values update roughly once per minute (sometimes ~90s gaps).
+# - We therefore avoid constant polling; we predict the next update and only poll
+#   frequently in a short "chase window" around that time.
+#
+# Adds:
+# - caching
+# - backoff (429 Retry-After respected if present)
+# - age_s: seconds since last observed upstream sample change (or since last refresh as fallback)
+#
+# Requires /secrets.json keys:
+#   ngenic_token
+#   ngenic_tune_uuid
+#   ngenic_grid_node_uuid
+
+import time
+import json
+from ngenic.ngenic_http11 import Session
+
+HOST = "app.ngenic.se"
+BASE = "/api/v3"
+
+
+def _field(body, key):
+    """Start index of the value after b'"key":' in body (spaces skipped), or -1."""
+    i = body.find(key)
+    if i < 0:
+        return -1
+    i += len(key)
+    while i < len(body) and body[i] == 32:
+        i += 1
+    return i
+
+
+def _parse_latest(body):
+    """
+    (has_value, time_str, value) from a "latest" body:
+    {"hasValue": true, "time": "...", "value": 1.23}
+    Scans for the three known fields instead of building a dict; anything
+    unexpected falls back to json.loads. None if the body isn't JSON at all.
+    """
+    try:
+        i = _field(body, b'"hasValue":')
+        if i < 0:
+            raise ValueError
+        has_value = body[i:i + 4] == b"true"
+
+        time_str = None
+        i = _field(body, b'"time":')
+        if i >= 0 and body[i:i + 1] == b'"':
+            j = body.find(b'"', i + 1)
+            time_str = body[i + 1:j].decode()
+
+        value = None
+        i = _field(body, b'"value":')
+        if i >= 0:
+            j = i
+            while j < len(body) and body[j] != 44 and body[j] != 125:  # "," "}"
+                j += 1
+            raw = body[i:j].strip()
+            if raw != b"null":
+                value = float(raw.decode())
+        return has_value, time_str, value
+    except Exception:
+        pass
+    try:
+        d = json.loads(body)
+        return bool(d.get("hasValue", False)), d.get("time"), d.get("value")
+    except Exception:
+        return None
+
+
+class NgenicClient:
+    def __init__(self, secrets_path="/secrets.json", secrets=None):
+        # Pass an already parsed secrets dict to skip re-reading the file.
+        sec = secrets
+        if sec is None:
+            with open(secrets_path, "r") as f:
+                sec = json.load(f)
+
+        self.token = sec["ngenic_token"]
+        self.tune_uuid = sec["ngenic_tune_uuid"]
+        self.node_uuid = sec["ngenic_grid_node_uuid"]
+
+        # Both "latest" reads go out pipelined on one keep-alive connection.
+        self._session = Session(HOST, timeout_s=20)
+        self._latest_paths = (
+            self._latest_path("power_kW").encode(),
+            self._latest_path("produced_power_kW").encode(),
+        )
+        self._req_headers = self._headers()
+
+        self._cache = {
+            "import_kW": None,
+            "export_kW": None,
+            "net_kW": None,
+            "import_time": None,       # Ngenic timestamp string
+            "export_time": None,       # Ngenic timestamp string
+            "updated_epoch": None,     # device epoch when refreshed (time.time())
+            "ok": False,
+            "last_error": None,
+
+            # Telemetry for freshness / cadence
+            "ngenic_time_changed_epoch": None,  # device epoch when we first observed a new Ngenic time stamp
+            "learned_interval_s": None,
+        }
+
+        # Bumped whenever _cache changes (every poll, success or failure).
+        self.version = 0
+
+        # Backoff control (errors / 429), device epoch seconds
+        self._backoff_until_epoch = 0
+        self._fail_count = 0
+
+        # Adaptive schedule: the next poll moment, recomputed once per poll so
+        # the per-second check is a single compare. 0 => poll now.
+        self._next_poll_epoch = 0
+
+        # Learning / cadence tracking (based on changes in Ngenic's "time" string)
+        self._last_time_str = None
+        self._last_change_epoch = None  # device epoch when time_str last changed
+
+        # Rolling interval estimate in 1/16 s (fixed point keeps the EWMA off
+        # the float path). Start with what your logs show most often.
+        self._interval_est_x16 = 60 * 16
+
+        # Polling knobs (defaults)
+        self._fast_boot_polls = 6           # first few polls: more eager to get initial values
+        self._boot_poll_s = 10              # during boot eager phase
+        self._idle_poll_s = 60              # when far from expected boundary
+        self._lead_s = 8                    # start chasing this many seconds before expected update
+        self._chase_poll_s = 5              # poll every 5s while chasing
+        self._chase_window_s = 40           # keep chasing up to this long past expected time
+
+    # --- Optional knobs (useful for short tests) ---
+    def set_polling_mode_fast(self, poll_s=10):
+        """
+        For short tests only. Makes the client behave more like fixed-interval polling.
+        Still honours backoff windows.
+        """
+        poll_s = int(max(5, poll_s))
+        self._fast_boot_polls = 999999
+        self._boot_poll_s = poll_s
+        self._idle_poll_s = poll_s
+        self._lead_s = 0
+        self._chase_poll_s = poll_s
+        self._chase_window_s = 300
+        self._schedule_next_poll()
+
+    def set_polling_mode_default(self):
+        """Return to conservative adaptive defaults."""
+        self._fast_boot_polls = 6
+        self._boot_poll_s = 10
+        self._idle_poll_s = 60
+        self._lead_s = 8
+        self._chase_poll_s = 5
+        self._chase_window_s = 40
+        self._schedule_next_poll()
+
+    # --- Public API ---
+    def get_cached(self):
+        """The live cache dict with age_s refreshed (no copy); treat as read-only."""
+        self._cache["age_s"] = self._compute_age_s()
+        return self._cache
+
+    def refresh_if_due(self, force=False):
+        """
+        Call frequently (e.g. once per second from your main loop).
+        It will decide whether to hit the Ngenic API or just return cached values.
+
+        force=True:
+          - still honours backoff windows
+          - otherwise bypasses adaptive scheduling and polls now
+        """
+        if self._in_backoff():
+            return self.get_cached()
+
+        now_epoch = time.time()
+
+        if not force and now_epoch < self._next_poll_epoch:
+            return self.get_cached()
+
+        self.version += 1
+        try:
+            imp_resp, exp_resp = self._session.get_json_pipeline(
+                self._latest_paths, self._req_headers, parser=_parse_latest
+            )
+            imp_val, imp_time = self._value_and_time("power_kW", imp_resp)
+            exp_val, exp_time = self._value_and_time("produced_power_kW", exp_resp)
+
+            net = None
+            if (imp_val is not None) or (exp_val is not None):
+                net = (imp_val or 0.0) - (exp_val or 0.0)
+
+            # Track cadence using whichever time string we got (prefer import_time).
+            time_str = imp_time or exp_time
+            self._observe_time_string_change(time_str, now_epoch)
+
+            self._cache.update({
+                "import_kW": imp_val,
+                "export_kW": exp_val,
+                "net_kW": net,
+                "import_time": imp_time,
+                "export_time": exp_time,
+                "updated_epoch": now_epoch,
+                "ok": True,
+                "last_error": None,
+                "ngenic_time_changed_epoch": self._last_change_epoch,
+                "learned_interval_s": round(self._interval_est_x16 / 16, 1),
+            })
+
+            self._fail_count = 0
+            self._schedule_next_poll()
+            return self.get_cached()
+
+        except Exception as e:
+            self._fail_count += 1
+            self._cache["ok"] = False
+            self._cache["last_error"] = repr(e)
+
+            # Exponential-ish backoff on errors (capped)
+            backoff_s = min(120, 5 * (2 ** min(self._fail_count - 1, 4)))
+            self._set_backoff(backoff_s)
+            self._schedule_next_poll()
+
+            return self.get_cached()
+
+    # --- Internals ---
+    def _compute_age_s(self):
+        now_epoch = time.time()
+        # Prefer "time changed" moment (freshness of upstream), otherwise fall back to our last refresh time.
+        ref = self._cache.get("ngenic_time_changed_epoch") or self._cache.get("updated_epoch")
+        if ref is None:
+            return None
+        age = now_epoch - ref
+        if age < 0:
+            age = 0
+        return int(age)
+
+    def _headers(self):
+        return {
+            "Authorization": "Bearer " + self.token,
+            "Accept": "application/json",
+            "User-Agent": "ESP32C6-MicroPython/1.27 ngenic-client",
+        }
+
+    def _set_backoff(self, seconds):
+        self._backoff_until_epoch = time.time() + int(seconds)
+
+    def _in_backoff(self):
+        return time.time() < self._backoff_until_epoch
+
+    def _schedule_next_poll(self):
+        """Sets _next_poll_epoch from the current phase (boot / idle / chase)."""
+        updated = self._cache["updated_epoch"]
+
+        # Never successfully updated: be eager (backoff still applies).
+        if updated is None:
+            self._next_poll_epoch = 0
+            return
+
+        # Initial eager polling for a few cycles
+        if self._fast_boot_polls > 0:
+            self._next_poll_epoch = updated + self._boot_poll_s
+            return
+
+        idle_at = updated + self._idle_poll_s
+
+        # No change reference yet: just idle poll.
+        if self._last_change_epoch is None:
+            self._next_poll_epoch = idle_at
+            return
+
+        # Predict the next upstream update and chase around it: poll every
+        # _chase_poll_s from _lead_s before it until _chase_window_s after.
+        # Outside that window (or once it has passed) fall back to idle polling.
+        expected = self._last_change_epoch + (self._interval_est_x16 >> 4)
+        chase_at = max(expected - self._lead_s, updated + self._chase_poll_s)
+        if chase_at <= expected + self._chase_window_s:
+            self._next_poll_epoch = min(idle_at, chase_at)
+        else:
+            self._next_poll_epoch = idle_at
+
+    def _observe_time_string_change(self, time_str, now_epoch):
+        if not time_str:
+            return
+
+        # First time we see a time string
+        if self._last_time_str is None:
+            self._last_time_str = time_str
+            self._last_change_epoch = now_epoch
+            return
+
+        # Detect change
+        if time_str != self._last_time_str:
+            # We saw a new upstream sample
+            if self._last_change_epoch is not None:
+                observed = now_epoch - self._last_change_epoch
+                # Ignore nonsense deltas
+                if 10 <= observed <= 300:
+                    # Update estimate gently (EWMA, alpha = 1/4) so it can adapt but not bounce
+                    self._interval_est_x16 += (int(observed * 16) - self._interval_est_x16) >> 2
+
+            self._last_time_str = time_str
+            self._last_change_epoch = now_epoch
+
+            # Boot eager phase counts down on actual upstream changes
+            if self._fast_boot_polls > 0:
+                self._fast_boot_polls -= 1
+
+        else:
+            # No upstream change; count down boot eager phase slowly (we've at least polled)
+            if self._fast_boot_polls > 0:
+                self._fast_boot_polls -= 1
+
+    def _latest_path(self, typ):
+        return "{}/tunes/{}/measurements/{}/latest?type={}".format(
+            BASE, self.tune_uuid, self.node_uuid, typ
+        )
+
+    def _value_and_time(self, typ, resp):
+        status, hdrs, parsed, body = resp
+
+        if status == 204:
+            return None, None
+
+        if status == 429:
+            ra = hdrs.get("retry-after")
+            try:
+                wait_s = int(ra) if ra else 60
+            except Exception:
+                wait_s = 60
+            self._set_backoff(wait_s)
+            raise RuntimeError("Rate limited (429), retry-after={}".format(ra))
+
+        if status != 200 or parsed is None:
+            snip = body[:120]
+            raise RuntimeError("HTTP {} for {} body={}".format(status, typ, snip))
+
+        # parsed: (hasValue, time, value) from _parse_latest
+        has_value, time_str, value = parsed
+        if not has_value:
+            return None, time_str
+
+        return value, time_str
\ No newline at end of file
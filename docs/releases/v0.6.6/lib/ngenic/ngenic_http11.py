@@ -0,0 +1,362 @@
+# ngenic_http11.py
+# Minimal HTTP/1.1 over TLS client for MicroPython (avoids urequests 426 issues)
+# get_json(): one-shot request. Session: keep-alive connection with pipelined GETs.
+
+import socket
+import json
+import time
+
+try:
+    import ussl as ssl
+except ImportError:
+    import ssl  # unlikely on ESP32
+
+
+_tls_ctx = None
+
+
+def _wrap_tls(sock, server_hostname):
+    # One client SSLContext serves every connection (MicroPython 1.23+);
+    # ssl.wrap_socket() builds and frees a fresh one on each call.
+    global _tls_ctx
+    if _tls_ctx is None:
+        try:
+            _tls_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            _tls_ctx.verify_mode = ssl.CERT_NONE  # same as wrap_socket's default
+        except AttributeError:
+            _tls_ctx = False  # older firmware: no SSLContext
+    if _tls_ctx:
+        return _tls_ctx.wrap_socket(sock, server_hostname=server_hostname)
+    return ssl.wrap_socket(sock, server_hostname=server_hostname)
+
+
+# A keep-alive Session connection is recycled after this many requests or
+# this many seconds, whichever comes first, so neither end holds one socket
+# and TLS session indefinitely.
+MAX_CONN_REQUESTS = 100
+MAX_CONN_AGE_S = 600
+
+
+def _decode_chunked(body):
+    out = bytearray()
+    mv = memoryview(body)
+    i = 0
+    n = len(body)
+    while i < n:
+        # Chunk size: hex digits folded straight into an int, no slice or
+        # int(x, 16); anything after them (";ext") is skipped to the LF.
+        size = 0
+        start = i
+        while i < n:
+            c = body[i]
+            if 48 <= c <= 57:  # 0-9
+                c -= 48
+            elif 97 <= c <= 102:  # a-f
+                c -= 87
+            elif 65 <= c <= 70:  # A-F
+                c -= 55
+            else:
+                break
+            size = (size << 4) | c
+            i += 1
+        if i == start:
+            break
+        j = body.find(b"\n", i)
+        if j < 0:
+            break
+        i = j + 1
+        if size == 0:
+            break
+        if i + size > n:
+            break
+        out.extend(mv[i:i + size])
+        i += size + 2  # skip data + CRLF
+    return bytes(out)
+
+
+def _parse_headers(header_bytes):
+    """
+    (status, headers) from a raw header block. Works on bytes; only each
+    header's name and value are decoded, not the whole block.
+    """
+    eol = header_bytes.find(b"\r\n")
+    status_line = header_bytes if eol < 0 else header_bytes[:eol]
+    try:
+        status = int(status_line[9:12])  # b"HTTP/1.1 NNN ..."
+    except ValueError:
+        status = 0
+
+    hdrs = {}
+    if eol < 0:
+        return status, hdrs
+    for ln in header_bytes[eol + 2:].split(b"\r\n"):
+        if b":" not in ln:
+            continue
+        k, v = ln.split(b":", 1)
+        hdrs[k.strip().decode("utf-8", "ignore").lower()] = v.strip().decode("utf-8", "ignore")
+    return status, hdrs
+
+
+def get_json(host, path, headers=None, port=443, timeout_s=20, server_hostname=None):
+    """
+    Returns: (status:int, resp_headers:dict, parsed_json|None, body_bytes:bytes)
+    """
+    if headers is None:
+        headers = {}
+
+    addr = socket.getaddrinfo(host, port)[0][-1]
+    sock = socket.socket()
+    sock.settimeout(timeout_s)
+    sock.connect(addr)
+    s = _wrap_tls(sock, server_hostname or host)
+
+    req = "GET {} HTTP/1.1\r\nHost: {}\r\nConnection: close\r\n".format(path, host)
+    for k, v in headers.items():
+        req += "{}: {}\r\n".format(k, v)
+    req += "\r\n"
+
+    s.write(req.encode("utf-8"))
+
+    # Read until close into one buffer, doubling it when full, instead of
+    # re-copying the whole response on every 1 KB read.
+    buf = bytearray(4096)
+    mv = memoryview(buf)
+    off = 0
+    while True:
+        if off == len(buf):
+            grown = bytearray(2 * len(buf))
+            grown[:off] = buf
+            buf = grown
+            mv = memoryview(buf)
+        n = s.readinto(mv[off:])
+        if not n:
+            break
+        off += n
+    raw = bytes(mv[:off])
+    buf = mv = None
+
+    try:
+        s.close()
+    except Exception:
+        pass
+
+    sep = raw.find(b"\r\n\r\n")
+    if sep < 0:
+        return 0, {}, None, raw
+
+    status, resp_headers = _parse_headers(raw[:sep])
+    body = raw[sep + 4:]
+
+    if resp_headers.get("transfer-encoding", "").lower() == "chunked":
+        body = _decode_chunked(body)
+
+    parsed = None
+    # Best effort JSON parse
+    try:
+        parsed = json.loads(body.decode("utf-8"))
+    except Exception:
+        parsed = None
+
+    return status, resp_headers, parsed, body
+
+
+# Scratch buffer for chunked bodies: chunks are read through it and appended,
+# instead of allocating a buffer and a bytes copy per chunk.
+_SCRATCH = bytearray(512)
+_SCRATCH_MV = memoryview(_SCRATCH)
+
+
+def _append_exact(s, out, n):
+    while n:
+        k = s.readinto(_SCRATCH_MV[:n] if n < 512 else _SCRATCH_MV)
+        if not k:
+            raise OSError("connection closed mid-body")
+        out.extend(_SCRATCH_MV[:k])
+        n -= k
+
+
+def _read_exact(s, n):
+    buf = bytearray(n)
+    mv = memoryview(buf)
+    got = 0
+    while got < n:
+        k = s.readinto(mv[got:])
+        if not k:
+            raise OSError("connection closed mid-body")
+        got += k
+    return bytes(buf)
+
+
+def _read_response(s):
+    """
+    Reads one framed response from s.
+    Returns (status, headers, body_bytes, reusable).
+    """
+    status_line = s.readline()
+    if not status_line:
+        raise OSError("connection closed")
+    try:
+        status = int(status_line[9:12])  # b"HTTP/1.1 NNN ..."
+    except ValueError:
+        status = 0
+
+    # Only each header's name and value are decoded (and the name lowered),
+    # never the whole line.
+    hdrs = {}
+    while True:
+        ln = s.readline()
+        if not ln or ln == b"\r\n":
+            break
+        i = ln.find(b":")
+        if i > 0:
+            hdrs[ln[:i].strip().decode("utf-8", "ignore").lower()] = ln[i + 1:].strip().decode("utf-8", "ignore")
+
+    reusable = hdrs.get("connection", "").lower() != "close"
+    if status // 100 == 1 or status in (204, 304):
+        body = b""  # never has a body, whatever the headers say
+    elif hdrs.get("transfer-encoding", "").lower() == "chunked":
+        out = bytearray()
+        while True:
+            size = int(s.readline().split(b";", 1)[0].strip() or b"0", 16)
+            if size == 0:
+                while True:  # trailers end with an empty line
+                    ln = s.readline()
+                    if not ln or ln == b"\r\n":
+                        break
+                break
+            _append_exact(s, out, size)
+            s.readline()  # CRLF after chunk data
+        body = bytes(out)
+    elif "content-length" in hdrs:
+        body = _read_exact(s, int(hdrs["content-length"]))
+    else:
+        body = s.read()  # until close
+        reusable = False
+    return status, hdrs, body, reusable
+
+
+def _parse_json(body):
+    try:
+        return json.loads(body.decode("utf-8"))
+    except Exception:
+        return None
+
+
+class Session:
+    """
+    One keep-alive TLS connection to a single host. get_json_pipeline() writes
+    several GETs back to back and then reads the responses in order, so a
+    batch of requests costs one handshake and roughly one round trip.
+    """
+
+    def __init__(self, host, port=443, timeout_s=20, server_hostname=None):
+        self.host = host
+        self.port = port
+        self.timeout_s = timeout_s
+        self.server_hostname = server_hostname or host
+        self._s = None
+        self._addr = None  # resolved once; cleared when a connect fails
+        self._tail = None  # encoded request text after the path
+        self._tail_headers = None
+        self._count = 0  # requests sent on the open connection
+        self._opened_ms = 0
+
+    def close(self):
+        if self._s is not None:
+            try:
+                self._s.close()
+            except Exception:
+                pass
+            self._s = None
+
+    def _connect(self):
+        if self._addr is None:
+            self._addr = socket.getaddrinfo(self.host, self.port)[0][-1]
+        sock = socket.socket()
+        sock.settimeout(self.timeout_s)
+        try:
+            sock.connect(self._addr)
+            return _wrap_tls(sock, self.server_hostname)
+        except Exception:
+            sock.close()
+            self._addr = None  # the address may have changed (e.g. after a Wi-Fi rejoin)
+            raise
+
+    def _open(self):
+        self._s = self._connect()
+        self._count = 0
+        self._opened_ms = time.ticks_ms()
+
+    def _expired(self):
+        return (self._count >= MAX_CONN_REQUESTS
+                or time.ticks_diff(time.ticks_ms(), self._opened_ms) > MAX_CONN_AGE_S * 1000)
+
+    def _request_tail(self, headers):
+        # Only the path varies between requests; the rest is encoded once
+        # and rebuilt only when the caller's headers change.
+        if self._tail is None or self._tail_headers != headers:
+            tail = " HTTP/1.1\r\nHost: {}\r\nConnection: keep-alive\r\n".format(self.host)
+            for k, v in headers.items():
+                tail += "{}: {}\r\n".format(k, v)
+            self._tail = (tail + "\r\n").encode("utf-8")
+            self._tail_headers = dict(headers)
+        return self._tail
+
+    def _pipeline(self, s, paths, headers, parser, out):
+        tail = self._request_tail(headers)
+        req = bytearray()
+        for path in paths:
+            req += b"GET "
+            req += path.encode("utf-8") if isinstance(path, str) else path
+            req += tail
+        s.write(req)
+
+        reusable = True
+        for _ in paths:
+            if not reusable:
+                raise OSError("server closed the connection mid-pipeline")
+            status, hdrs, body, reusable = _read_response(s)
+            out.append((status, hdrs, parser(body) if body else None, body))
+        return reusable
+
+    def get_json_pipeline(self, paths, headers=None, parser=None, out=None):
+        """
+        Returns a list of (status, resp_headers, parsed|None, body_bytes),
+        one per path (str or pre-encoded bytes), in order. Closes the
+        connection on any error. parser(body) replaces the generic JSON parse
+        when the caller knows the body's shape. If out (a list) is given,
+        responses are appended to it as they arrive, so the ones read before
+        an error are still there when it is raised.
+        """
+        if headers is None:
+            headers = {}
+        if parser is None:
+            parser = _parse_json
+        if out is None:
+            out = []
+
+        if self._s is not None and self._expired():
+            self.close()
+
+        reused = self._s is not None
+        if not reused:
+            self._open()
+        try:
+            reusable = self._pipeline(self._s, paths, headers, parser, out)
+        except Exception:
+            self.close()
+            if not reused:
+                raise
+            # The idle connection went stale: one fresh attempt.
+            del out[:]
+            self._open()
+            try:
+                reusable = self._pipeline(self._s, paths, headers, parser, out)
+            except Exception:
+                self.close()
+                raise
+
+        self._count += len(paths)
+        if not reusable:
+            self.close()
+        return out
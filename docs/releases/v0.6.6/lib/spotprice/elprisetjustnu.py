@@ -0,0 +1,419 @@
+import time
+import os
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+try:
+    from array import array
+except ImportError:
+    from uarray import array
+
+from ngenic.ngenic_http11 import Session
+from timeutil import (
+    utc_to_stockholm_tuple,
+    stockholm_today_tomorrow_ymd,
+    parse_iso8601_to_utc_epoch,
+    utc_to_stockholm_iso8601,
+)
+
+# Per-day slot columns: start_utc/end_utc are 'i' (epoch seconds), sek is 'f'.
+# Nothing reads the EUR price, so it is not kept.
+_INT_COLS = ("start_utc", "end_utc")
+_FLOAT_COLS = ("sek",)
+
+
+def _new_day():
+    return {
+        "start_utc": array("i"),
+        "end_utc": array("i"),
+        "sek": array("f"),
+    }
+
+
+def _day_from_json(d):
+    """
+    Rebuilds a cached day as arrays. Accepts the column layout written by
+    _save_cache and the older list-of-slot-dicts layout.
+    """
+    if isinstance(d, dict):
+        out = {}
+        for k in _INT_COLS:
+            out[k] = array("i", d.get(k) or [])
+        for k in _FLOAT_COLS:
+            out[k] = array("f", d.get(k) or [])
+        return out
+
+    out = _new_day()
+    for s in d or []:
+        try:
+            a = s.get("start_utc")
+            b = s.get("end_utc")
+            p = s.get("sek_per_kwh")
+            if a is None or b is None or p is None:
+                continue
+            out["start_utc"].append(int(a))
+            out["end_utc"].append(int(b))
+            out["sek"].append(float(p))
+        except Exception:
+            pass
+    return out
+
+
+def _value(body, key, lo, hi):
+    """
+    Raw bytes of the value after b'"key":' within body[lo:hi] (quotes
+    stripped), or None. Searches in place; only the value is copied.
+    """
+    i = body.find(key, lo, hi)
+    if i < 0:
+        return None
+    i += len(key)
+    while i < hi and body[i] == 32:
+        i += 1
+    if i < hi and body[i] == 34:  # '"'
+        return body[i + 1:body.find(b'"', i + 1, hi)]
+    j = body.find(b",", i, hi)
+    return body[i:j if j >= 0 else hi].strip()
+
+
+def _add_slot(day, body, lo, hi, prev):
+    """
+    Appends the price object in body[lo:hi] (between its braces) to day.
+    prev is (time_end, epoch) of the previous slot: slots are chronological,
+    so this slot's time_start is normally that same string and is not
+    parsed again. Returns the (time_end, epoch) pair for the next slot.
+    """
+    ts = _value(body, b'"time_start":', lo, hi)
+    te = _value(body, b'"time_end":', lo, hi)
+    sek = _value(body, b'"SEK_per_kWh":', lo, hi)
+    if ts is None or te is None or sek is None:
+        return prev
+    if prev is not None and ts == prev[0]:
+        a = prev[1]
+    else:
+        a = parse_iso8601_to_utc_epoch(ts.decode())
+    b = parse_iso8601_to_utc_epoch(te.decode())
+    if a is None or b is None:
+        return prev
+    day["start_utc"].append(a)
+    day["end_utc"].append(b)
+    day["sek"].append(float(sek))
+    return te, b
+
+
+def _parse_day(body):
+    """
+    Builds a day from the price array body without materializing it as
+    Python objects. The payload is a flat array of flat objects, so each '}'
+    closes one slot; fields are found by searching that range of body, and
+    only the three values used are ever copied out.
+    """
+    day = _new_day()
+    prev = None
+    pos = 0
+    while True:
+        e = body.find(b"}", pos)
+        if e < 0:
+            break
+        prev = _add_slot(day, body, pos, e, prev)
+        pos = e + 1
+    return day
+
+
+def _int_or_null(x):
+    return "null" if x is None else "%d" % x
+
+
+def _str_or_null(x):
+    return "null" if x is None else json.dumps(x)
+
+
+def _day_text(day):
+    return '{"start_utc":[%s],"end_utc":[%s],"sek":[%s]}' % (
+        ",".join(["%d" % v for v in day["start_utc"]]),
+        ",".join(["%d" % v for v in day["end_utc"]]),
+        ",".join([str(v) for v in day["sek"]]),
+    )
+
+
+def day_to_slots(day):
+    """
+    The day as the list of slot dicts /api/prices has always returned; the
+    columns are an in-memory layout only. The EUR price is not kept, so
+    eur_per_kwh is null.
+    """
+    starts = day["start_utc"]
+    ends = day["end_utc"]
+    sek = day["sek"]
+    out = []
+    for i in range(len(starts)):
+        out.append({
+            "start_utc": starts[i],
+            "end_utc": ends[i],
+            "sek_per_kwh": sek[i],
+            "eur_per_kwh": None,
+            "time_start": utc_to_stockholm_iso8601(starts[i]),
+            "time_end": utc_to_stockholm_iso8601(ends[i]),
+        })
+    return out
+
+
+class SpotPriceClient:
+    """
+    Fetches spot prices from elprisetjustnu and caches only:
+      - today (Europe/Stockholm date)
+      - tomorrow (when available)
+
+    Cache location (survives OTA swaps):
+      /data/spotprices_<AREA>.json
+
+    Changes vs v0.4.1:
+      - Tomorrow HTTP 404 is treated as NOT READY (normal), not an error.
+      - fetched_epoch is always kept meaningful once today's prices exist.
+      - Cache trimmed to (today, tomorrow) on every save (bounded file size).
+    """
+
+    HOST = "www.elprisetjustnu.se"
+
+    def __init__(self, area="SE3", cache_path=None, session=None):
+        self.area = area
+        self.cache_path = cache_path or ("/data/spotprices_%s.json" % area)
+        # area is fixed per client, so only the date is formatted per fetch.
+        self._path_tmpl = "/api/v1/prices/%s/%s-%s_" + area + ".json"
+        # today and tomorrow are fetched back to back: one TLS handshake.
+        self._session = session or Session(self.HOST)
+        self._last_saved_hash = None
+        self._dir_ok = False  # /data created (or found) once per boot
+        # Bumped whenever cached content changes, so callers can reuse
+        # anything they derived from it until then.
+        self.version = 0
+
+        self._cache = {
+            "area": area,
+            "fetched_epoch": None,
+            "age_s": None,
+            "days": {},  # {"YYYY-MM-DD": {"start_utc", "end_utc", "sek"}}
+            "last_error": None,
+            "next_fetch_epoch": 0,
+
+            # extra helpful fields for UI/debug
+            "today_ymd": None,
+            "tomorrow_ymd": None,
+            "tomorrow_status": None,  # ok | not_ready | skipped | error
+        }
+
+    def load_cache(self):
+        try:
+            with open(self.cache_path, "r") as f:
+                self._cache = json.load(f)
+        except OSError:
+            pass
+        days = self._cache.get("days") or {}
+        self._cache["days"] = {ymd: _day_from_json(d) for ymd, d in days.items()}
+        self.version += 1
+        return self.get_cached()
+
+    def _ensure_data_dir(self):
+        if self._dir_ok:
+            return
+        try:
+            os.mkdir("/data")
+        except OSError:
+            pass
+        self._dir_ok = True
+
+    def _save_cache(self, today_ymd, tomorrow_ymd):
+        """
+        Trims the cache to (today, tomorrow) and writes it via a temp file and
+        rename, so a power cut mid-write leaves the previous file intact.
+        Skips the write when the content matches what was last written.
+        """
+        self._trim_days(today_ymd, tomorrow_ymd)
+        text = self._serialize_cache()
+        h = hash(text)
+        if h == self._last_saved_hash:
+            return
+
+        self._ensure_data_dir()
+        tmp = self.cache_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        if hasattr(os, "sync"):
+            os.sync()
+        try:
+            os.rename(tmp, self.cache_path)
+        except OSError:
+            # Filesystems that refuse to rename over an existing file.
+            os.remove(self.cache_path)
+            os.rename(tmp, self.cache_path)
+        self._last_saved_hash = h
+
+    def _serialize_cache(self):
+        """
+        The cache as JSON text. The schema is fixed, so keys are written in a
+        set order with % formatting instead of a generic json.dumps walk;
+        same content always gives the same text.
+        """
+        c = self._cache
+        days = ",".join(['"%s":%s' % (ymd, _day_text(d)) for ymd, d in c["days"].items()])
+        return (
+            '{"area":%s,"fetched_epoch":%s,"age_s":null,"days":{%s},"last_error":%s,'
+            '"next_fetch_epoch":%s,"today_ymd":%s,"tomorrow_ymd":%s,"tomorrow_status":%s}'
+        ) % (
+            _str_or_null(c.get("area")),
+            _int_or_null(c.get("fetched_epoch")),
+            days,
+            _str_or_null(c.get("last_error")),
+            _int_or_null(c.get("next_fetch_epoch")),
+            _str_or_null(c.get("today_ymd")),
+            _str_or_null(c.get("tomorrow_ymd")),
+            _str_or_null(c.get("tomorrow_status")),
+        )
+
+    def _trim_days(self, today_ymd, tomorrow_ymd):
+        # In place: the steady state (only today/tomorrow cached) allocates
+        # nothing beyond the short key list.
+        days = self._cache["days"]
+        for k in list(days):
+            if k != today_ymd and k != tomorrow_ymd:
+                days.pop(k)
+
+    def get_cached(self):
+        """
+        The live cache dict with age_s refreshed; no copy is made, so callers
+        must treat it as read-only.
+        """
+        c = self._cache
+        if c.get("fetched_epoch") is not None:
+            c["age_s"] = int(max(0, time.time() - c["fetched_epoch"]))
+        else:
+            c["age_s"] = None
+        return c
+
+    def _path_for_local_date(self, ymd):
+        return self._path_tmpl % (ymd[0:4], ymd[5:7], ymd[8:10])
+
+    def _fetch_days(self, ymds):
+        """
+        Returns: ({ymd: (status_code:int, day:dict|None)}, error|None)
+
+        All dates go out pipelined on one connection. day holds parallel
+        arrays (start_utc, end_utc, sek), one entry per slot, instead of
+        one dict per slot. The body is scanned for the fields we use rather
+        than parsed into a list of dicts.
+
+        If the connection fails after some dates were answered, those are
+        returned along with the error; dates after it are missing. If none
+        were answered, the error is raised.
+        """
+        paths = [self._path_for_local_date(ymd) for ymd in ymds]
+        resps = []
+        err = None
+        try:
+            self._session.get_json_pipeline(paths, parser=_parse_day, out=resps)
+        except Exception as e:
+            if not resps:
+                raise
+            err = e
+        out = {}
+        for ymd, (status, _hdrs, day, _body) in zip(ymds, resps):
+            out[ymd] = (status, day if status == 200 else None)
+        return out, err
+
+    def refresh_if_due(self, utc_epoch=None):
+        now = utc_epoch if utc_epoch is not None else time.time()
+
+        # Backoff window
+        if now < self._cache.get("next_fetch_epoch", 0):
+            return self.get_cached()
+
+        today, tomorrow = stockholm_today_tomorrow_ymd(now)
+        if self._cache.get("today_ymd") != today:
+            self._cache["today_ymd"] = today
+            self._cache["tomorrow_ymd"] = tomorrow
+            # Drop yesterday now; the "nothing to do" path below never saves.
+            self._trim_days(today, tomorrow)
+            self.version += 1
+
+        need_today = today not in self._cache["days"]
+
+        t_loc = utc_to_stockholm_tuple(now)
+        after_1305 = (t_loc[3] > 13) or (t_loc[3] == 13 and t_loc[4] >= 5)
+        need_tomorrow = after_1305 and (tomorrow not in self._cache["days"])
+
+        # If today is already present, keep fetched_epoch meaningful
+        if (not need_today) and (self._cache.get("fetched_epoch") is None):
+            self._cache["fetched_epoch"] = now
+            self.version += 1
+
+        # Nothing to do
+        if not need_today and not need_tomorrow:
+            if self._cache.get("tomorrow_status") != "skipped" or self._cache.get("last_error") is not None:
+                self._cache["tomorrow_status"] = "skipped"
+                self._cache["last_error"] = None
+                self.version += 1
+            return self.get_cached()
+
+        # Every path below changes the cache.
+        self.version += 1
+
+        wanted = []
+        if need_today:
+            wanted.append(today)
+        if need_tomorrow:
+            wanted.append(tomorrow)
+        # today (when wanted) is first, so it is always in fetched.
+        fetched, err = self._fetch_days(wanted)
+
+        # --- Fetch today (required) ---
+        if need_today:
+            code, day = fetched[today]
+            if code != 200:
+                self._cache["last_error"] = "today fetch failed: HTTP %d" % code
+                self._cache["next_fetch_epoch"] = now + 10 * 60
+                self._cache["tomorrow_status"] = "skipped"
+                try:
+                    self._save_cache(today, tomorrow)
+                except Exception:
+                    pass
+                return self.get_cached()
+
+            self._cache["days"][today] = day
+            self._cache["fetched_epoch"] = now
+            self._cache["last_error"] = None
+            self._cache["next_fetch_epoch"] = 0
+
+        # --- Fetch tomorrow (optional) ---
+        if need_tomorrow:
+            code, day = fetched.get(tomorrow, (None, None))
+            if code is None:
+                # The connection failed after today's response; today is kept.
+                self._cache["tomorrow_status"] = "error"
+                self._cache["last_error"] = "tomorrow fetch failed: %r" % (err,)
+                self._cache["next_fetch_epoch"] = now + 30 * 60
+            elif code == 200:
+                self._cache["days"][tomorrow] = day
+                self._cache["tomorrow_status"] = "ok"
+                self._cache["last_error"] = None
+                self._cache["next_fetch_epoch"] = 0
+            elif code == 404:
+                # Normal: tomorrow not published yet
+                self._cache["tomorrow_status"] = "not_ready"
+                self._cache["last_error"] = None
+                self._cache["next_fetch_epoch"] = now + 30 * 60
+            else:
+                self._cache["tomorrow_status"] = "error"
+                self._cache["last_error"] = "tomorrow fetch failed: HTTP %d" % code
+                self._cache["next_fetch_epoch"] = now + 30 * 60
+        else:
+            self._cache["tomorrow_status"] = "skipped"
+
+        try:
+            self._save_cache(today, tomorrow)
+        except Exception:
+            pass
+
+        return self.get_cached()
\ No newline at end of file
@@ -0,0 +1,172 @@
+# Last flatten_slots/build_price_index result and the day objects it came
+# from. SpotPriceClient replaces a day's dict whenever it refetches, so an
+# identity match means the slots are unchanged. Holding the day objects also
+# keeps their ids from being reused.
+_memo = {"days": None, "slots": None, "index": None}
+
+
+def _day_objects(prices_cache):
+    days = (prices_cache or {}).get("days") or {}
+    return tuple([days[k] for k in sorted(days)])
+
+
+def _same_days(a, b):
+    if b is None or len(a) != len(b):
+        return False
+    for i in range(len(a)):
+        if a[i] is not b[i]:
+            return False
+    return True
+
+
+def flatten_slots(prices_cache):
+    """
+    prices_cache: dict returned by SpotPriceClient.get_cached()
+    returns (starts, ends, prices): parallel lists sorted by start_utc
+    Memoized until the cached days change.
+    """
+    objs = _day_objects(prices_cache)
+    if _same_days(objs, _memo["days"]):
+        return _memo["slots"]
+
+    rows = []
+    for day in objs:
+        if not isinstance(day, dict):
+            continue
+        try:
+            rows.extend(zip(day["start_utc"], day["end_utc"], day["sek"]))
+        except Exception:
+            pass
+    rows.sort()
+    slots = [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows]
+    _memo["days"] = objs
+    _memo["slots"] = slots
+    _memo["index"] = None
+    return slots
+
+
+def get_price_index(prices_cache):
+    """build_price_index() for the cached slots, memoized with them."""
+    slots = flatten_slots(prices_cache)
+    if _memo["index"] is None:
+        _memo["index"] = build_price_index(slots)
+    return _memo["index"]
+
+
+def _slot_index(starts, ends, t):
+    """
+    Index of the slot containing t, or -1. Binary search on the sorted starts
+    (MicroPython has no bisect module).
+    """
+    lo = 0
+    hi = len(starts)
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if starts[mid] <= t:
+            lo = mid + 1
+        else:
+            hi = mid
+    i = lo - 1
+    if i >= 0 and t < ends[i]:
+        return i
+    return -1
+
+
+def price_at_utc(slots, utc_epoch):
+    """
+    Returns sek_per_kwh for the slot containing utc_epoch, or None.
+    Accepts flatten_slots() output or a build_price_index() index.
+    """
+    starts, ends, prices = slots[0], slots[1], slots[2]
+    i = _slot_index(starts, ends, utc_epoch)
+    return prices[i] if i >= 0 else None
+
+
+def align_up(utc_epoch, step_s):
+    """
+    Round up utc_epoch to next multiple of step_s.
+    """
+    r = utc_epoch % step_s
+    if r == 0:
+        return utc_epoch
+    return utc_epoch + (step_s - r)
+
+
+def build_price_index(slots):
+    """
+    (starts, ends, prices, cum, brk) for avg_price_for_window, built once per
+    set of slots:
+      cum[i] = price-seconds of slots before i (prefix sum)
+      brk[i] = number of gaps between consecutive slots up to slot i
+    """
+    starts, ends, prices = slots
+    n = len(starts)
+    cum = [0.0] * (n + 1)
+    brk = [0] * n
+    acc = 0.0
+    gaps = 0
+    for j in range(n):
+        if j and ends[j - 1] != starts[j]:
+            gaps += 1
+        brk[j] = gaps
+        acc += float(prices[j]) * (ends[j] - starts[j])
+        cum[j + 1] = acc
+    return starts, ends, prices, cum, brk
+
+
+def avg_price_for_window(index, start_utc, duration_s):
+    """
+    Weighted average SEK/kWh across [start_utc, start_utc+duration_s).
+    Returns None if window not fully covered by slots.
+
+    index comes from build_price_index(): the slots holding the window's first
+    and last second are found by bisection and the sum in between is a
+    prefix-sum difference, so the cost does not grow with the window.
+    """
+    if duration_s <= 0:
+        return None
+    starts, ends, prices, cum, brk = index
+    end_utc = start_utc + duration_s
+
+    i = _slot_index(starts, ends, start_utc)
+    if i < 0:
+        return None
+    k = _slot_index(starts, ends, end_utc - 1)
+    if k < 0 or brk[k] != brk[i]:
+        return None
+
+    total = (
+        cum[k] - cum[i]
+        - float(prices[i]) * (start_utc - starts[i])
+        + float(prices[k]) * (end_utc - starts[k])
+    )
+    return total / duration_s
+
+
+def avg_prices_for_windows(index, starts_utc, duration_s):
+    """
+    avg_price_for_window() for each start in starts_utc (ascending), in one
+    sweep: the first/last slot pointers only move forward, so the whole list
+    costs one pass over the slots instead of two searches per window.
+    """
+    starts, ends, prices, cum, brk = index
+    n = len(starts)
+    out = []
+    i = 0
+    k = 0
+    for t in starts_utc:
+        last = t + duration_s - 1  # last second inside the window
+        while i < n and ends[i] <= t:
+            i += 1
+        while k < n and ends[k] <= last:
+            k += 1
+        if duration_s <= 0 or k >= n or starts[i] > t or starts[k] > last or brk[k] != brk[i]:
+            out.append(None)
+            continue
+        total = (
+            cum[k] - cum[i]
+            - float(prices[i]) * (t - starts[i])
+            + float(prices[k]) * (last + 1 - starts[k])
+        )
+        out.append(total / duration_s)
+    return out
@@ -0,0 +1 @@
+# Package marker for MicroPython imports
@@ -0,0 +1,36 @@
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "device"))
+
+import ngenic_http11  # noqa: E402
+
+
+class _Stream(io.BytesIO):
+    """Canned server bytes; whatever the client writes is discarded."""
+
+    def write(self, b):
+        return len(b)
+
+
+def test_pipelined_204_does_not_swallow_next_response():
+    stream = _Stream(
+        b"HTTP/1.1 204 No Content\r\n\r\n"
+        b"HTTP/1.1 200 OK\r\nContent-Length: 17\r\n\r\n"
+        b'{"hasValue":true}'
+    )
+    sess = ngenic_http11.Session("app.ngenic.se")
+    out = []
+    reusable = sess._pipeline(stream, ["/a", "/b"], {}, ngenic_http11._parse_json, out)
+
+    assert [r[0] for r in out] == [204, 200]
+    assert out[0][3] == b""
+    assert out[1][2] == {"hasValue": True}
+    assert reusable
+
+
+def test_304_has_no_body_and_keeps_connection():
+    stream = _Stream(b"HTTP/1.1 304 Not Modified\r\nETag: \"x\"\r\n\r\n")
+    status, _hdrs, body, reusable = ngenic_http11._read_response(stream)
+    assert (status, body, reusable) == (304, b"", True)
@@ -0,0 +1,70 @@
+import calendar
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "docs", "releases", "v0.6.6", "lib"))
+
+# MicroPython's mktime takes an 8-tuple and treats it as UTC.
+time.mktime = lambda t: calendar.timegm(tuple(t[:6]) + (0, 0, 0))
+
+from spotprice import elprisetjustnu  # noqa: E402
+
+BODY = (
+    b'[{"SEK_per_kWh":0.5,"EUR_per_kWh":0.04,"EXR":11.5,'
+    b'"time_start":"2026-01-15T00:00:00+01:00","time_end":"2026-01-15T00:15:00+01:00"},'
+    b'{"SEK_per_kWh":0.75,"EUR_per_kWh":0.065,"EXR":11.5,'
+    b'"time_start":"2026-01-15T00:15:00+01:00","time_end":"2026-01-15T00:30:00+01:00"}]'
+)
+
+
+def test_api_prices_keeps_slot_shape():
+    slots = elprisetjustnu.day_to_slots(elprisetjustnu._parse_day(BODY))
+    assert [s["time_start"] for s in slots] == ["2026-01-15T00:00:00+01:00", "2026-01-15T00:15:00+01:00"]
+    assert slots[1]["time_end"] == "2026-01-15T00:30:00+01:00"
+    assert slots[0]["end_utc"] == slots[1]["start_utc"]
+    assert [s["sek_per_kwh"] for s in slots] == [0.5, 0.75]
+    assert slots[1]["eur_per_kwh"] is None
+    assert sorted(slots[0]) == sorted(
+        ("start_utc", "end_utc", "sek_per_kwh", "eur_per_kwh", "time_start", "time_end")
+    )
+
+
+def test_cache_round_trip():
+    import json
+
+    day = elprisetjustnu._parse_day(BODY)
+    back = elprisetjustnu._day_from_json(json.loads(elprisetjustnu._day_text(day)))
+    assert elprisetjustnu.day_to_slots(back) == elprisetjustnu.day_to_slots(day)
+
+
+class _DropsAfterFirst:
+    """Answers the first pipelined request, then the connection fails."""
+
+    def get_json_pipeline(self, paths, headers=None, parser=None, out=None):
+        out.append((200, {}, parser(BODY), BODY))
+        raise OSError("connection reset")
+
+
+def test_tomorrow_failure_keeps_today(tmp_path):
+    client = elprisetjustnu.SpotPriceClient(
+        cache_path=str(tmp_path / "prices.json"), session=_DropsAfterFirst()
+    )
+    client._dir_ok = True
+    now = calendar.timegm((2026, 1, 15, 14, 0, 0))  # 15:00 Stockholm: tomorrow is due
+    c = client.refresh_if_due(now)
+
+    assert list(c["days"]) == ["2026-01-15"]
+    assert c["fetched_epoch"] == now
+    assert c["tomorrow_status"] == "error"
+    assert "connection reset" in c["last_error"]
+    assert (tmp_path / "prices.json").exists()
+
+
+def test_day_change_drops_yesterday_without_fetching():
+    client = elprisetjustnu.SpotPriceClient(session=object())
+    day = elprisetjustnu._parse_day(BODY)
+    client._cache["days"] = {"2026-01-14": day, "2026-01-15": day}
+    client._cache["today_ymd"] = "2026-01-14"
+    c = client.refresh_if_due(calendar.timegm((2026, 1, 15, 8, 0, 0)))  # before 13:05
+    assert list(c["days"]) == ["2026-01-15"]
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "docs", "releases", "v0.6.6", "lib"))
+
+import timeutil  # noqa: E402
+
+
+def test_isoymdhms_fields():
+    assert timeutil._isoymdhms("2025-11-09T13:28:32") == (2025, 11, 9, 13, 28, 32)
+    assert timeutil._isoymdhms("2025-11-09T13:28") == (2025, 11, 9, 13, 28, 0)
+
+
+@pytest.mark.parametrize("s", [
+    "2025-1-09T00:00:00",
+    "2025-11-09T0a:00:00",
+    "2025/11/09T00:00:00",
+    "2025-11-09T00:00-00",
+])
+def test_malformed_timestamp_raises(s):
+    with pytest.raises(ValueError):
+        timeutil._isoymdhms(s)
+    with pytest.raises(ValueError):
+        timeutil.parse_iso8601_to_utc_epoch(s + "Z")
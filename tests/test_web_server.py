@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "docs", "releases", "v0.6.6"))
+
+# MicroPython's ticks API, frozen at 0 ms: every request below lands in the
+# same rate window.
+time.ticks_ms = lambda: 0
+time.ticks_diff = lambda a, b: a - b
+
+from web import server  # noqa: E402
+
+API_PATHS = (
+    "/api/status",
+    "/api/prices",
+    "/api/recommendations",
+    "/api/weather_hourly?hours=24",
+    "/api/solar_hourly?hours=24",
+    "/api/pv_hourly?hours=24",
+)
+
+
+class _Client:
+    def __init__(self, request):
+        self._req = request
+        self.sent = bytearray()
+
+    def readinto(self, buf):
+        n = min(len(buf), len(self._req))
+        buf[:n] = self._req[:n]
+        self._req = self._req[n:]
+        return n
+
+    def sendall(self, b):
+        self.sent += b
+
+    def settimeout(self, t):
+        pass
+
+    def setsockopt(self, *a):
+        pass
+
+    def shutdown(self, how):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Listener:
+    def __init__(self):
+        self.queue = []
+
+    def accept(self):
+        return self.queue.pop(0), ("192.168.1.20", 50000)
+
+
+def _server():
+    srv = server.WebServer.__new__(server.WebServer)
+    srv._sock = _Listener()
+    srv._rate = {}
+    srv._recv_buf = bytearray(256)
+    srv._chunk_buf = bytearray(520)
+    return srv
+
+
+def _get(srv, handlers, path):
+    cl = _Client(b"GET %s HTTP/1.1\r\nHost: esp32\r\n\r\n" % path.encode())
+    srv._sock.queue.append(cl)
+    srv.poll_once(handlers)
+    return int(bytes(cl.sent[9:12]))
+
+
+def test_page_loads_are_not_rate_limited():
+    handlers = {p.split("?")[0]: (lambda q: b"{}") for p in API_PATHS}
+    srv = _server()
+
+    # Three full page loads in one window: reload, a second tab, poll timer.
+    for _ in range(3):
+        assert _get(srv, handlers, "/") == 200
+        assert _get(srv, handlers, "/favicon.ico") == 404
+        for p in API_PATHS:
+            assert _get(srv, handlers, p) == 200
+
+
+def test_runaway_api_client_gets_429():
+    srv = _server()
+    handlers = {"/api/status": lambda q: b"{}"}
+    codes = [_get(srv, handlers, "/api/status") for _ in range(server.RATE_MAX_REQUESTS + 1)]
+    assert codes[-1] == 429
+    assert codes[:-1] == [200] * server.RATE_MAX_REQUESTS
+
+
+def _accepts(request):
+    cl = _Client(request)
+    buf = bytearray(256)
+    n = cl.readinto(memoryview(buf)[:40])  # part of the request already read
+    return server._accepts_gzip(cl, buf, n)
+
+
+def test_gzip_only_when_accepted():
+    cookie = b"Cookie: " + b"x" * 600 + b"\r\n"
+    assert _accepts(b"GET / HTTP/1.1\r\nHost: esp32\r\n" + cookie + b"Accept-Encoding: gzip, br\r\n\r\n")
+    assert not _accepts(b"GET / HTTP/1.1\r\nHost: esp32\r\nAccept-Encoding: identity\r\n\r\n")
+    assert not _accepts(b"GET / HTTP/1.1\r\nHost: esp32\r\n\r\nAccept-Encoding: gzip\r\n")
@@ -0,0 +1,25 @@
+# manifest.py — frozen-module manifest for a custom ESP32_GENERIC_C6 build
+#
+# Freezing the launcher modules puts their bytecode in flash instead of
+# compiling the .py source onto the GC heap at every boot, which leaves more
+# heap for TLS and the OTA download buffers.
+#
+# Build from a MicroPython checkout (ports/esp32):
+#   make BOARD=ESP32_GENERIC_C6 FROZEN_MANIFEST=/path/to/tools/firmware/manifest.py
+#
+# Only launcher modules are frozen: the app under /app is what OTA replaces,
+# so it has to stay on the filesystem. Remove the flash copies of the frozen
+# modules afterwards; a .py in / is found before the frozen one.
+
+include("$(PORT_DIR)/boards/manifest.py")
+
+freeze(
+    "../../device",
+    (
+        "updater.py",
+        "http11.py",
+        "secrets.py",
+        "status_led.py",
+    ),
+    opt=3,
+)
@@ -0,0 +1,177 @@
+# ngenic_http.py
+# Helpers shared by the Ngenic tools: Wi-Fi bring-up, TLS wrapping and a
+# one-shot HTTP/1.1 GET that streams JSON bodies into json.load().
+#
+# Needs secrets.py from device/ on the board. Scripts that poll repeatedly use
+# the keep-alive ngenic_http11.Session instead of http11_get_json().
+
+import io
+import json
+import time
+import socket
+
+from secrets import get_secrets
+
+# network and ssl are imported where first needed: both allocate on import,
+# and a run that fails on its secrets shouldn't pay for them or fragment the
+# heap ahead of the first TLS context.
+
+HOST = "app.ngenic.se"
+PORT = 443
+
+_ADDR = None  # HOST resolved on first use; cleared when a connect fails
+
+
+def connect_wifi(timeout_s=20, sec=None):
+    if sec is None:
+        sec = get_secrets()
+    ssid = sec.get("wifi_ssid")
+    pw = sec.get("wifi_password")
+    if not ssid:
+        raise RuntimeError("No wifi_ssid in /secrets.json")
+
+    import network
+
+    wlan = network.WLAN(network.WLAN.IF_STA)
+    wlan.active(True)
+    if not wlan.isconnected():
+        wlan.connect(ssid, pw)
+        t0 = time.ticks_ms()
+        while not wlan.isconnected():
+            if time.ticks_diff(time.ticks_ms(), t0) > timeout_s * 1000:
+                raise RuntimeError("Wi-Fi connect timeout")
+            time.sleep(0.2)
+
+    # Power save adds up to a beacon interval to each round trip; trade
+    # standby current for latency while the tools run.
+    try:
+        wlan.config(pm=wlan.PM_NONE)
+    except Exception:
+        pass
+    return wlan
+
+
+_tls_ctx = None
+
+
+def wrap_tls(sock, server_hostname):
+    # Reuse one SSLContext across requests when the firmware has it
+    try:
+        import ussl as ssl
+    except ImportError:
+        import ssl  # unlikely on ESP32
+
+    global _tls_ctx
+    if _tls_ctx is None:
+        try:
+            _tls_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            _tls_ctx.verify_mode = ssl.CERT_NONE  # same as wrap_socket's default
+        except AttributeError:
+            _tls_ctx = False  # older firmware: no SSLContext
+    if _tls_ctx:
+        return _tls_ctx.wrap_socket(sock, server_hostname=server_hostname)
+    return ssl.wrap_socket(sock, server_hostname=server_hostname)
+
+
+class _Chunked(io.IOBase):
+    """Decodes a chunked body as it is read, so json.load() can stream it."""
+
+    def __init__(self, s):
+        self._s = s
+        self._left = 0
+        self._eof = False
+
+    def readinto(self, buf):
+        if self._eof:
+            return 0
+        if not self._left:
+            try:
+                self._left = int(self._s.readline().split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                self._left = 0
+            if not self._left:
+                self._eof = True
+                return 0
+        n = self._s.readinto(memoryview(buf)[:min(len(buf), self._left)])
+        if not n:
+            self._eof = True
+            return 0
+        self._left -= n
+        if not self._left:
+            self._s.readline()  # CRLF after chunk data
+        return n
+
+
+def _read_all(r):
+    out = bytearray()
+    buf = bytearray(256)
+    mv = memoryview(buf)
+    while True:
+        n = r.readinto(buf)
+        if not n:
+            break
+        out.extend(mv[:n])
+    return bytes(out)
+
+
+def http11_get_json(path, token, timeout_s=20, agent="ngenic-probe"):
+    """
+    Returns (status, parsed|None, body). A 200 body is fed straight from the
+    socket into json.load() and never buffered, so body is b"" then; other
+    statuses are read whole for printing.
+    """
+    global _ADDR
+    if _ADDR is None:
+        _ADDR = socket.getaddrinfo(HOST, PORT)[0][-1]
+    sock = socket.socket()
+    sock.settimeout(timeout_s)
+    try:
+        sock.connect(_ADDR)
+        s = wrap_tls(sock, HOST)
+    except Exception:
+        sock.close()
+        _ADDR = None
+        raise
+
+    req = (
+        "GET {path} HTTP/1.1\r\n"
+        "Host: {host}\r\n"
+        "User-Agent: ESP32C6-MicroPython/1.27 {agent}\r\n"
+        "Accept: application/json\r\n"
+        "Authorization: Bearer {token}\r\n"
+        "Connection: close\r\n"
+        "\r\n"
+    ).format(path=path, host=HOST, agent=agent, token=token)
+
+    try:
+        s.write(req.encode("utf-8"))
+
+        line = s.readline()
+        try:
+            status = int(line[9:12])  # b"HTTP/1.1 NNN ..."
+        except ValueError:
+            return 0, None, line
+
+        chunked = False
+        while True:
+            ln = s.readline()
+            if not ln or ln == b"\r\n":
+                break
+            # Lower only the name prefix, then the value, not whole lines
+            if ln[:18].lower() == b"transfer-encoding:" and b"chunked" in ln[18:].lower():
+                chunked = True
+
+        # The server closes after the body, so identity bodies end at EOF.
+        body_stream = _Chunked(s) if chunked else s
+        if status != 200:
+            return status, None, _read_all(body_stream)
+
+        try:
+            return status, json.load(body_stream), b""
+        except Exception:
+            return status, None, b""
+    finally:
+        try:
+            s.close()
+        except Exception:
+            pass
@@ -17,53 +17,67 @@ ON_AFTER_S = 30
 OFF_AFTER_S = 45
 REST_S = 60
 
+# CSV row cadence (milliseconds)
+PRINT_INTERVAL_MS = 1000
+
+# CSV columns: header row and the cached-state keys printed in that order
+CSV_HEADER = "device_epoch,import_kW,export_kW,net_kW,import_time,export_time,ok,last_error"
+CSV_FIELDS = ("updated_epoch", "import_kW", "export_kW", "net_kW",
+              "import_time", "export_time", "ok", "last_error")
+
+
 def run():
     ng = NgenicClient()
     ng.set_polling_mode_fast(TEST_REFRESH_S)   # fast-ish polling for the test
 
-    t0 = time.time()
+    # Everything runs off absolute ticks_ms deadlines; the loop sleeps exactly
+    # until whichever comes next (refresh, CSV row or prompt).
+    t0 = time.ticks_ms()
     next_refresh = t0
+    next_print = t0
 
-    # Build prompt timeline
+    # Build prompt timeline (offsets in seconds from start -> absolute deadlines)
     prompts = []
-    t = t0 + WARMUP_S
-    prompts.append((t, "READY. Starting toggles soon."))
+    t = WARMUP_S
+    prompts.append((time.ticks_add(t0, t * 1000), "READY. Starting toggles soon."))
     for i in range(CYCLES):
         t_on = t + ON_AFTER_S
         t_off = t_on + OFF_AFTER_S
-        prompts.append((t_on, f"== ACTION: TURN ON emergency charge (cycle {i+1}/{CYCLES}) =="))
-        prompts.append((t_off, f"== ACTION: TURN OFF emergency charge (cycle {i+1}/{CYCLES}) =="))
+        prompts.append((time.ticks_add(t0, t_on * 1000), f"== ACTION: TURN ON emergency charge (cycle {i+1}/{CYCLES}) =="))
+        prompts.append((time.ticks_add(t0, t_off * 1000), f"== ACTION: TURN OFF emergency charge (cycle {i+1}/{CYCLES}) =="))
         t = t_off + REST_S
 
     prompt_i = 0
+    n_prompts = len(prompts)
 
-    print("device_epoch,import_kW,export_kW,net_kW,import_time,export_time,ok,last_error")
+    print(CSV_HEADER)
 
     while True:
-        now = time.time()
+        now = time.ticks_ms()
 
         # Print prompts at scheduled times
-        while prompt_i < len(prompts) and now >= prompts[prompt_i][0]:
+        while prompt_i < n_prompts and time.ticks_diff(now, prompts[prompt_i][0]) >= 0:
             print(prompts[prompt_i][1])
             prompt_i += 1
 
         # Refresh on schedule
-        if now >= next_refresh:
+        if time.ticks_diff(now, next_refresh) >= 0:
             ng.refresh_if_due(force=True)  # force during the test
-            next_refresh = now + TEST_REFRESH_S
-
-        st = ng.get_cached()
-        print("{},{},{},{},{},{},{},{}".format(
-            st.get("updated_epoch"),
-            st.get("import_kW"),
-            st.get("export_kW"),
-            st.get("net_kW"),
-            st.get("import_time"),
-            st.get("export_time"),
-            st.get("ok"),
-            st.get("last_error"),
-        ))
-
-        time.sleep(1)
+            next_refresh = time.ticks_add(now, TEST_REFRESH_S * 1000)
+
+        if time.ticks_diff(now, next_print) >= 0:
+            st = ng.get_cached()
+            get = st.get
+            print(",".join([str(get(k)) for k in CSV_FIELDS]))
+            next_print = time.ticks_add(next_print, PRINT_INTERVAL_MS)
+            if time.ticks_diff(next_print, now) <= 0:
+                next_print = time.ticks_add(now, PRINT_INTERVAL_MS)  # fell behind; don't burst
+
+        # Sleep until the nearest deadline
+        now = time.ticks_ms()
+        delay = min(time.ticks_diff(next_refresh, now), time.ticks_diff(next_print, now))
+        if prompt_i < n_prompts:
+            delay = min(delay, time.ticks_diff(prompts[prompt_i][0], now))
+        time.sleep_ms(max(1, delay))
 
 run()
\ No newline at end of file
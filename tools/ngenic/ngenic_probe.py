@@ -8,9 +8,12 @@
 # Requirements:
 #   - Wi-Fi connected OR provide ssid/password in /secrets.json and call connect_wifi() first.
 #   - /secrets.json contains: {"ngenic_token": "..."}
+#   - secrets.py from device/ (shared parsed copy of /secrets.json)
+#   - ngenic_http.py from tools/ngenic/ (Wi-Fi and TLS helpers)
 #
 # Notes:
 #   - This is intentionally defensive: it prints status + small body snippets only.
+#   - All paths share one keep-alive TLS connection (HttpSession).
 #   - If you get 401/403 on most endpoints, token/subscription scope is the issue.
 #   - If you still get 426 here, it’s likely a server-side policy beyond HTTP/1.1.
 
@@ -18,12 +21,12 @@ import json
 import time
 import socket
 
-try:
-    import ussl as ssl
-except ImportError:
-    import ssl  # pragma: no cover (unlikely on ESP32)
+from secrets import get_secrets
+from ngenic_http import connect_wifi, wrap_tls
 
-import network
+# Prime the json module: MicroPython's first json.loads() is several times
+# slower unless json.dumps() has run once (CircuitPython json issue).
+json.dumps(None)
 
 
 HOST = "app.ngenic.se"
@@ -31,42 +34,75 @@ PORT = 443
 BASE = "/api/v3"
 SNIP = 300  # body snippet length
 
-
-def _load_secrets():
-    with open("/secrets.json", "r") as f:
-        return json.load(f)
-
-
-def connect_wifi(timeout_s=20):
-    sec = _load_secrets()
-    ssid = sec.get("wifi_ssid")
-    pw = sec.get("wifi_password")
-    if not ssid:
-        raise RuntimeError("No wifi_ssid in /secrets.json")
-
-    wlan = network.WLAN(network.WLAN.IF_STA)
-    wlan.active(True)
-    if wlan.isconnected():
-        return wlan
-
-    wlan.connect(ssid, pw)
-    t0 = time.ticks_ms()
-    while not wlan.isconnected():
-        if time.ticks_diff(time.ticks_ms(), t0) > timeout_s * 1000:
-            raise RuntimeError("Wi-Fi connect timeout")
-        time.sleep(0.2)
-    return wlan
+# “Wide net” probe, built once at import:
+# - Some are expected to 404; that’s fine.
+# - The aim is to learn what your account/token can see (200 vs 401/403),
+#   and whether the server still returns 426 for any reason.
+_TOP_PATHS = (
+    # Root-ish
+    "/",
+    BASE,
+    BASE + "/",
+    BASE + "/health",
+    BASE + "/status",
+    BASE + "/version",
+    BASE + "/me",
+    BASE + "/user",
+    BASE + "/users/me",
+    BASE + "/account",
+    BASE + "/accounts",
+
+    # Primary object in Tune API
+    BASE + "/tunes",
+    BASE + "/tunes/",
+)
+
+# Per-tune paths: {0}=BASE, {1}=tune_uuid
+_DEEP_TMPL = (
+    # Nodes / gateway
+    "{0}/tunes/{1}/gateway",
+    "{0}/tunes/{1}/gateway/",
+    "{0}/tunes/{1}/gateway/nodes",
+    "{0}/tunes/{1}/gateway/nodes/",
+    "{0}/tunes/{1}/nodes",
+    "{0}/tunes/{1}/nodes/",
+
+    # Often useful
+    "{0}/tunes/{1}/rooms",
+    "{0}/tunes/{1}/rooms/",
+    "{0}/tunes/{1}/weather",
+    "{0}/tunes/{1}/settings",
+)
+
+# Where node listings may live, in order of preference
+_NODES_TMPL = (
+    "{0}/tunes/{1}/gateway/nodes/",
+    "{0}/tunes/{1}/nodes/",
+)
+
+# Measurement paths: {0}=BASE, {1}=tune_uuid, {2}=node_uuid
+_MEAS_TMPL = (
+    "{0}/tunes/{1}/measurements/{2}/types",
+    "{0}/tunes/{1}/measurements/{2}/types/",
+    "{0}/tunes/{1}/measurements/{2}/latest",
+    "{0}/tunes/{1}/measurements/{2}/latest/",
+)
+
+
+# One receive buffer for the whole sweep; bodies are appended from it.
+_BUF = bytearray(1024)
+_MV = memoryview(_BUF)
 
 
 def _recv_all(s):
     # Read until close
-    chunks = []
+    out = bytearray()
     while True:
-        data = s.read(1024)
-        if not data:
+        n = s.readinto(_BUF)
+        if not n:
             break
-        chunks.append(data)
-    return b"".join(chunks)
+        out.extend(_MV[:n])
+    return bytes(out)
 
 
 def _parse_headers(header_bytes):
@@ -86,83 +122,159 @@ def _parse_headers(header_bytes):
     return code, hdrs
 
 
-def _decode_chunked(body):
-    # Minimal chunked decoder
-    out = b""
-    i = 0
-    n = len(body)
+def _read_exact(s, n):
+    out = bytearray(n)
+    mv = memoryview(out)
+    got = 0
+    while got < n:
+        k = s.readinto(mv[got:])
+        if not k:
+            break
+        got += k
+    return bytes(out[:got]) if got < n else bytes(out)
+
+
+def _read_chunked(s):
+    # Minimal chunked decoder reading straight off the socket; stops at the
+    # terminating zero-length chunk so the connection can be reused.
+    out = bytearray()
     while True:
-        j = body.find(b"\r\n", i)
-        if j < 0:
+        line = s.readline()
+        if not line:
             break
-        line = body[i:j].split(b";", 1)[0].strip()
         try:
-            chunk_len = int(line, 16)
+            chunk_len = int(line.split(b";", 1)[0].strip(), 16)
         except ValueError:
             break
-        i = j + 2
         if chunk_len == 0:
+            # Skip optional trailers up to the final empty line
+            while True:
+                ln = s.readline()
+                if not ln or ln == b"\r\n":
+                    break
             break
-        if i + chunk_len > n:
-            break
-        out += body[i:i + chunk_len]
-        i += chunk_len + 2  # skip data + CRLF
-    return out
+        while chunk_len:
+            k = s.readinto(_MV[:chunk_len] if chunk_len < 1024 else _MV)
+            if not k:
+                return bytes(out)
+            out.extend(_MV[:k])
+            chunk_len -= k
+        s.readline()  # CRLF after chunk data
+    return bytes(out)
+
+
+class HttpSession:
+    """
+    One keep-alive TLS connection to HOST, reused for every probe request
+    (a TLS handshake per path dominates the probe sweep otherwise).
+    Reconnects transparently when the server closes the connection.
+    """
+
+    def __init__(self, token=None, timeout_s=20):
+        self.token = token
+        self.timeout_s = timeout_s
+        self._s = None
+        self._addr = None  # HOST resolved once; cleared when a connect fails
+
+    def _connect(self):
+        if self._addr is None:
+            self._addr = socket.getaddrinfo(HOST, PORT)[0][-1]
+        sock = socket.socket()
+        sock.settimeout(self.timeout_s)
+        try:
+            sock.connect(self._addr)
+            self._s = wrap_tls(sock, HOST)
+        except Exception:
+            sock.close()
+            self._addr = None
+            raise
+
+    def close(self):
+        if self._s is not None:
+            try:
+                self._s.close()
+            except Exception:
+                pass
+            self._s = None
+
+    def _request(self, path, extra_headers):
+        headers = {
+            "Host": HOST,
+            "User-Agent": "ESP32C6-MicroPython/1.27 ngenic-probe",
+            "Accept": "application/json, text/plain;q=0.9, */*;q=0.1",
+            "Connection": "keep-alive",
+        }
+        if self.token:
+            headers["Authorization"] = "Bearer " + self.token
+        if extra_headers:
+            headers.update(extra_headers)
+
+        req = "GET {} HTTP/1.1\r\n".format(path)
+        for k, v in headers.items():
+            req += "{}: {}\r\n".format(k, v)
+        req += "\r\n"
+
+        s = self._s
+        s.write(req.encode("utf-8"))
+
+        head = bytearray()
+        while True:
+            ln = s.readline()
+            if not ln or ln == b"\r\n":
+                break
+            head.extend(ln)
+        if not head:
+            raise OSError("connection closed")
+        return _parse_headers(bytes(head))
+
+    def get(self, path, extra_headers=None):
+        """Returns: (status, headers, body_bytes, parsed_json|None)"""
+        reused = self._s is not None
+        if not reused:
+            self._connect()
+        try:
+            status, hdrs = self._request(path, extra_headers)
+        except Exception:
+            self.close()
+            if not reused:
+                raise
+            # Idle connection was dropped by the server: retry once on a fresh one.
+            self._connect()
+            status, hdrs = self._request(path, extra_headers)
+
+        s = self._s
+        keep = hdrs.get("connection", "").lower() != "close"
+        if status // 100 == 1 or status in (204, 304):
+            body = b""  # bodiless by definition; don't read until close
+        elif hdrs.get("transfer-encoding", "").lower() == "chunked":
+            body = _read_chunked(s)
+        elif "content-length" in hdrs:
+            body = _read_exact(s, int(hdrs["content-length"]))
+        else:
+            body = _recv_all(s)
+            keep = False
+        if not keep:
+            self.close()
+
+        # Try JSON parse (best effort)
+        parsed = None
+        ct = hdrs.get("content-type", "")
+        if "json" in ct or (body[:1] in (b"{", b"[")):
+            try:
+                parsed = json.loads(body.decode("utf-8"))
+            except Exception:
+                parsed = None
+
+        return status, hdrs, body, parsed
 
 
 def http11_get_json_or_text(path, token=None, extra_headers=None, timeout_s=20):
-    addr = socket.getaddrinfo(HOST, PORT)[0][-1]
-    sock = socket.socket()
-    sock.settimeout(timeout_s)
-    sock.connect(addr)
-    s = ssl.wrap_socket(sock, server_hostname=HOST)
-
-    headers = {
-        "Host": HOST,
-        "User-Agent": "ESP32C6-MicroPython/1.27 ngenic-probe",
-        "Accept": "application/json, text/plain;q=0.9, */*;q=0.1",
-        "Connection": "close",
-    }
-    if token:
-        headers["Authorization"] = "Bearer " + token
-    if extra_headers:
-        headers.update(extra_headers)
-
-    req = "GET {} HTTP/1.1\r\n".format(path)
-    for k, v in headers.items():
-        req += "{}: {}\r\n".format(k, v)
-    req += "\r\n"
-
-    s.write(req.encode("utf-8"))
-    raw = _recv_all(s)
+    # One-shot request (own connection); use HttpSession for several paths.
+    sess = HttpSession(token=token, timeout_s=timeout_s)
     try:
-        s.close()
-    except Exception:
-        pass
-
-    # Split headers/body
-    sep = raw.find(b"\r\n\r\n")
-    if sep < 0:
-        return 0, {}, b"", None
-
-    header_bytes = raw[:sep]
-    body = raw[sep + 4:]
-
-    status, hdrs = _parse_headers(header_bytes)
-
-    if hdrs.get("transfer-encoding", "").lower() == "chunked":
-        body = _decode_chunked(body)
-
-    # Try JSON parse (best effort)
-    parsed = None
-    ct = hdrs.get("content-type", "")
-    if "json" in ct or (body[:1] in (b"{", b"[")):
-        try:
-            parsed = json.loads(body.decode("utf-8"))
-        except Exception:
-            parsed = None
-
-    return status, hdrs, body, parsed
+        return sess.get(path, extra_headers=extra_headers)
+    finally:
+        sess.close()
 
 
 def _print_result(path, status, hdrs, body, parsed):
@@ -186,14 +298,15 @@ def _print_result(path, status, hdrs, body, parsed):
         print("body (snippet):", txt[:SNIP])
 
 
-def _probe_paths(paths, token):
+def _probe_paths(paths, sess):
     results = []
     for p in paths:
         try:
-            status, hdrs, body, parsed = http11_get_json_or_text(p, token=token)
+            status, hdrs, body, parsed = sess.get(p)
             _print_result(p, status, hdrs, body, parsed)
             results.append((p, status, hdrs.get("content-type", ""), len(body)))
         except Exception as e:
+            sess.close()  # connection state unknown; next path reconnects
             print("\n==", p)
             print("error:", repr(e))
             results.append((p, -1, "", 0))
@@ -202,47 +315,34 @@ def _probe_paths(paths, token):
 
 
 def run():
+    sec = get_secrets()
+
     # Ensure Wi-Fi is up (optional; remove if you connect elsewhere)
     try:
-        connect_wifi()
+        connect_wifi(sec=sec)
     except Exception as e:
         print("Wi-Fi connect skipped/failed:", repr(e))
         # Continue anyway in case you're already connected
 
-    sec = _load_secrets()
     token = sec.get("ngenic_token", "")
     if not token:
         raise RuntimeError("Missing ngenic_token in /secrets.json")
 
-    # “Wide net” probe:
-    # - Some are expected to 404; that’s fine.
-    # - The aim is to learn what your account/token can see (200 vs 401/403),
-    #   and whether the server still returns 426 for any reason.
-    paths = [
-        # Root-ish
-        "/",
-        BASE,
-        BASE + "/",
-        BASE + "/health",
-        BASE + "/status",
-        BASE + "/version",
-        BASE + "/me",
-        BASE + "/user",
-        BASE + "/users/me",
-        BASE + "/account",
-        BASE + "/accounts",
-
-        # Primary object in Tune API
-        BASE + "/tunes",
-        BASE + "/tunes/",
-    ]
-
-    results = _probe_paths(paths, token)
+    # One keep-alive TLS connection for the whole sweep
+    sess = HttpSession(token=token)
+    try:
+        _run_probe(sess)
+    finally:
+        sess.close()
+
+
+def _run_probe(sess):
+    results = _probe_paths(_TOP_PATHS, sess)
 
     # If we can list tunes, attempt deeper discovery automatically.
     tune_uuid = None
     try:
-        status, hdrs, body, parsed = http11_get_json_or_text(BASE + "/tunes/", token=token)
+        status, hdrs, body, parsed = sess.get(BASE + "/tunes/")
         if status == 200 and parsed is not None:
             # parsed may be list or {"items":[...]}
             items = None
@@ -254,6 +354,7 @@ def run():
                 t0 = items[0]
                 tune_uuid = t0.get("uuid") or t0.get("tuneUuid") or t0.get("id")
     except Exception:
+        sess.close()
         tune_uuid = None
 
     if not tune_uuid:
@@ -265,29 +366,15 @@ def run():
 
     print("\nDiscovered tune_uuid:", tune_uuid)
 
-    deep_paths = [
-        # Nodes / gateway
-        f"{BASE}/tunes/{tune_uuid}/gateway",
-        f"{BASE}/tunes/{tune_uuid}/gateway/",
-        f"{BASE}/tunes/{tune_uuid}/gateway/nodes",
-        f"{BASE}/tunes/{tune_uuid}/gateway/nodes/",
-        f"{BASE}/tunes/{tune_uuid}/nodes",
-        f"{BASE}/tunes/{tune_uuid}/nodes/",
-
-        # Often useful
-        f"{BASE}/tunes/{tune_uuid}/rooms",
-        f"{BASE}/tunes/{tune_uuid}/rooms/",
-        f"{BASE}/tunes/{tune_uuid}/weather",
-        f"{BASE}/tunes/{tune_uuid}/settings",
-    ]
-
-    _probe_paths(deep_paths, token)
+    deep_paths = [t.format(BASE, tune_uuid) for t in _DEEP_TMPL]
+    _probe_paths(deep_paths, sess)
 
     # Try to discover a node UUID for measurements
     node_uuid = None
-    for nodes_path in (f"{BASE}/tunes/{tune_uuid}/gateway/nodes/", f"{BASE}/tunes/{tune_uuid}/nodes/"):
+    for tmpl in _NODES_TMPL:
+        nodes_path = tmpl.format(BASE, tune_uuid)
         try:
-            st, hdrs, body, parsed = http11_get_json_or_text(nodes_path, token=token)
+            st, hdrs, body, parsed = sess.get(nodes_path)
             if st != 200 or parsed is None:
                 continue
             items = None
@@ -300,7 +387,7 @@ def run():
                 if node_uuid:
                     break
         except Exception:
-            pass
+            sess.close()
 
     if not node_uuid:
         print("\nCould not discover a node UUID for measurements.")
@@ -309,12 +396,7 @@ def run():
 
     print("\nDiscovered node_uuid:", node_uuid)
 
-    meas_paths = [
-        f"{BASE}/tunes/{tune_uuid}/measurements/{node_uuid}/types",
-        f"{BASE}/tunes/{tune_uuid}/measurements/{node_uuid}/types/",
-        f"{BASE}/tunes/{tune_uuid}/measurements/{node_uuid}/latest",
-        f"{BASE}/tunes/{tune_uuid}/measurements/{node_uuid}/latest/",
-    ]
-    _probe_paths(meas_paths, token)
+    meas_paths = [t.format(BASE, tune_uuid, node_uuid) for t in _MEAS_TMPL]
+    _probe_paths(meas_paths, sess)
 
     print("\nDone.")
\ No newline at end of file
@@ -1,10 +1,16 @@
 import time
 from ngenic_client import NgenicClient
 
+PRINT_INTERVAL_MS = 1000
+
 ng = NgenicClient()
 
 print("device_epoch,import_kW,export_kW,net_kW,age_s,learned_interval_s,import_time,export_time,ok,last_error")
 
+# Rows run off an absolute ticks_ms deadline, so the time a refresh spends on
+# the network comes out of the 1 s tick instead of being added to it.
+next_print = time.ticks_ms()
+
 while True:
     st = ng.refresh_if_due()
     print("{},{},{},{},{},{},{},{},{},{}".format(
@@ -19,4 +25,9 @@ while True:
         st.get("ok"),
         st.get("last_error"),
     ))
-    time.sleep(1)
\ No newline at end of file
+    next_print = time.ticks_add(next_print, PRINT_INTERVAL_MS)
+    delay = time.ticks_diff(next_print, time.ticks_ms())
+    if delay > 0:
+        time.sleep_ms(delay)
+    else:
+        next_print = time.ticks_ms()  # fell behind; don't burst